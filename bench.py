@@ -0,0 +1,263 @@
+"""Hot-path benchmarks against a temp SQLite DB and synthetic guilds (no Discord connection).
+
+    python bench.py                          # 1k/10k/100k members, writes bench_results.json
+    python bench.py --sizes 1000 --out a.json
+    python bench.py --compare a.json         # print change vs an earlier run
+    python bench.py --check-plans            # EXPLAIN every hot statement; exit 1 on scans / temp B-trees
+
+The plan check also runs under pytest (test_query_plans.py).
+"""
+import os, sys, json, time, random, argparse, tempfile, statistics, platform, shutil, atexit
+
+_tmp = tempfile.mkdtemp(prefix="phoenixp-bench-")
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+os.environ["XP_DB_PATH"] = os.path.join(_tmp, "xp.db")
+os.environ.setdefault("TRACE_PATH", os.path.join(_tmp, "traces.jsonl"))
+
+import main  # noqa: E402  (DB path must be set before import)
+
+DAY = 86400
+
+
+def _pct(sorted_ns: list[int], q: float) -> float:
+    i = min(len(sorted_ns) - 1, max(0, round(q * (len(sorted_ns) - 1))))
+    return sorted_ns[i] / 1e6
+
+
+def measure(fn, iterations: int) -> dict:
+    """Call fn(i) `iterations` times; per-call latency in ms plus throughput."""
+    samples: list[int] = []
+    started = time.perf_counter_ns()
+    for i in range(iterations):
+        t = time.perf_counter_ns()
+        fn(i)
+        samples.append(time.perf_counter_ns() - t)
+    wall = (time.perf_counter_ns() - started) / 1e9
+    samples.sort()
+    return {
+        "n": iterations,
+        "ops_per_sec": round(iterations / wall, 1) if wall else None,
+        "p50_ms": round(_pct(samples, 0.50), 4),
+        "p99_ms": round(_pct(samples, 0.99), 4),
+        "mean_ms": round(statistics.fmean(samples) / 1e6, 4),
+    }
+
+
+def seed_guild(gid: int, size: int, ts: int, rng: random.Random) -> list[int]:
+    """Members with a realistic spread: ~15% active this week, the rest idle for up to 90 days."""
+    uids = [10_000_000 + i for i in range(size)]
+    rows = []
+    for uid in uids:
+        active = rng.random() < 0.15
+        last_active = ts - rng.randrange(0, 5 * DAY if active else 90 * DAY)
+        xp = rng.randrange(0, main.MAX_XP + 1)
+        rows.append((gid, uid, xp, last_active, last_active, 0, 0, 0, 0))
+    with main.db() as c:
+        c.executemany("""
+            INSERT OR REPLACE INTO users
+            (guild_id, user_id, xp, last_active, decay_through, chat_cooldown, last_minute,
+             earned_this_minute, vc_seconds)
+            VALUES (?,?,?,?,?,?,?,?,?)
+        """, rows)
+        c.commit()
+        main._xp_stores.pop(gid, None)
+        main.xp_store(c, gid)
+    return uids
+
+
+def bench_size(size: int, rng: random.Random) -> dict:
+    gid = size
+    ts = main.now()
+    uids = seed_guild(gid, size, ts, rng)
+    out: dict[str, dict] = {}
+
+    with main.db() as c:
+        picks = [rng.choice(uids) for _ in range(min(20_000, size * 2))]
+
+        def award(i):
+            # a minute apart per call so the per-minute cap never short-circuits it
+            main.award_xp(c, gid, picks[i], main.CHAT_XP_PER_TICK, ts + i * 60)
+
+        out["award_xp"] = measure(award, len(picks))
+        c.commit()
+        main._activity.pending.clear()
+
+        standings_iters = max(3, 200_000 // size)
+        out["decay_standings"] = measure(lambda i: main.guild_xp_standings(c, gid, ts + i * 60), standings_iters)
+        store = main.xp_store(c, gid)
+        cutoff = ts - main.DECAY_GRACE_HOURS * 3600
+        out["decay_loop_idle_scan"] = measure(lambda i: store.any_idle(cutoff), standings_iters)
+
+    out["compute_rank_map"] = measure(lambda i: main.compute_rank_map(gid, uids), max(3, 100_000 // size))
+    return out
+
+
+def store_memory(size: int) -> dict:
+    """Resident size of the guild's in-memory XP store (bench_size seeded it under gid=size)."""
+    with main.db() as c:
+        n = main.xp_store(c, size).memory_bytes()
+    return {"members": size, "bytes": n, "bytes_per_member": round(n / size, 1)}
+
+
+def bench_render(rng: random.Random) -> dict:
+    phrases = main.AUTO_BOLD_PHRASES
+    words = ["push", "the", "front", "on", "defend", "liberate", "tonight", "major", "order", "for", "and"]
+    texts = []
+    for _ in range(200):
+        toks = [rng.choice(words) for _ in range(rng.randrange(8, 60))]
+        for _ in range(rng.randrange(0, 4)):
+            toks.insert(rng.randrange(len(toks) + 1), rng.choice(phrases))
+        texts.append(" ".join(toks))
+
+    question = "Which front do we push this weekend: Malevelon Creek, Super Earth or Mars?"
+    options = [rng.choice(phrases) for _ in range(main.POLL_MAX_OPTIONS)]
+    ends_at = main.now()
+    return {
+        "auto_bold_phrases": measure(lambda i: main.auto_bold_phrases(texts[i % len(texts)]), 2_000),
+        # distinct counts per call: every close renders once, so measure the uncached path
+        "_poll_render_closed": measure(
+            lambda i: main._poll_render_closed(question, options, [i] + [1] * (len(options) - 1), ends_at), 2_000
+        ),
+    }
+
+
+# -------------------------
+# QUERY PLANS
+# -------------------------
+# (name, sql, params) for every statement main.py runs per event, per command or per loop tick.
+# The SQL is main.py's own, so a changed query is checked as written.
+_cols = ", ".join(main.GuildXpStore.FIELDS)
+HOT_QUERIES = [
+    ("store load", main.SQL_USERS_LOAD.format(cols=_cols), (1,)),
+    ("store update", main.SQL_USERS_UPDATE.format(sets="xp=?, last_active=?"), (1, 1, 1, 1)),
+    ("store fill", main.SQL_USERS_FILL.format(sets="chat_cooldown=?"), (0, 1)),
+    ("meta get", main.SQL_META_GET, ("k",)),
+    ("poll by id", main.SQL_POLL_GET, ("p",)),
+    ("poll vote", main.SQL_POLL_VOTE, ("p", 1, 0, 1)),
+    ("poll tally bump", main.SQL_POLL_TALLY_BUMP, ("p", 0)),
+    ("poll tallies", main.SQL_POLL_TALLIES, ("p",)),
+    ("open polls (schedule)", main.SQL_POLLS_OPEN, ()),
+    ("open polls (guild)", main.SQL_POLLS_OPEN_GUILD, (1,)),
+    ("due polls", main.SQL_POLLS_DUE.format(placeholders="?,?,?"), ("a", "b", "c")),
+    ("close poll", main.SQL_POLL_CLAIM_CLOSE, ("p",)),
+    ("xp_at", main.SQL_XP_AT, (1, 1, 1)),
+    ("xphistory", main.SQL_XP_HISTORY, (1, 1, 1)),
+    ("ledger compact", main.SQL_LEDGER_COMPACT, (1, 1)),
+    ("ledger snapshot", main.SQL_LEDGER_SNAPSHOT, (1,)),
+    ("activity (guild)", main.SQL_ACTIVITY_GUILD, (1, 1)),
+    ("activity (member)", main.SQL_ACTIVITY_MEMBER, (1, 1, 1)),
+    ("archive channel head", main.SQL_ARCHIVE_CHANNEL_HEAD, (1,)),
+    ("audit recompute", main.SQL_ARCHIVE_SINCE, (1, 1)),
+    ("dm dedupe", main.SQL_DM_SENT, (1, "k", 1)),
+    ("dm prune", main.SQL_DM_PRUNE, (1,)),
+    ("vc close", main.SQL_VC_CLOSE, (1, 1)),
+    ("vc checkpoint", main.SQL_VC_CHECKPOINT, (1, 1, 1)),
+]
+# query name -> plan lines that may SCAN, each with the reason; every other SCAN fails
+SCAN_OK = {
+    # the partial index holds only open polls; read once at startup
+    "open polls (schedule)": {"SCAN polls USING INDEX idx_polls_open"},
+}
+
+
+def seed_for_plans(rng: random.Random) -> None:
+    # a few guilds so ANALYZE sees guild_id as selective, like a real shared DB; a near-empty
+    # table gets stats that make a scan the cheapest plan, which says nothing about production
+    ts = main.now()
+    for gid in range(1, 5):
+        uids = seed_guild(gid, 1000, ts, rng)
+        with main.db() as c:
+            c.executemany(
+                "INSERT OR REPLACE INTO dm_deliveries (guild_id, campaign_key, user_id, sent_at) VALUES (?,?,?,?)",
+                [(gid, f"notify:{k}", uid, ts - rng.randrange(0, 2 * DAY)) for k in range(3) for uid in uids],
+            )
+            c.commit()
+    with main.db() as c:
+        c.execute("ANALYZE")
+        c.commit()
+
+
+def check_plans(c) -> list[str]:
+    failures = []
+    for name, sql, params in HOT_QUERIES:
+        plan = [r[3] for r in c.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        bad = [
+            d for d in plan
+            if "TEMP B-TREE" in d or (d.startswith("SCAN ") and d not in SCAN_OK.get(name, ()))
+        ]
+        print(f"{'FAIL' if bad else 'ok':4} {name:24} {' | '.join(plan)}")
+        if bad:
+            failures.append(name)
+    return failures
+
+
+def compare(new: dict, old: dict) -> None:
+    print(f"\n{'benchmark':44} {'old ops/s':>12} {'new ops/s':>12} {'change':>8}   p99 old → new (ms)")
+    for group, results in new["results"].items():
+        for name, r in results.items():
+            o = old.get("results", {}).get(group, {}).get(name)
+            if not o or not o.get("ops_per_sec") or not r.get("ops_per_sec"):
+                continue
+            change = (r["ops_per_sec"] / o["ops_per_sec"] - 1) * 100
+            print(f"{group + '/' + name:44} {o['ops_per_sec']:>12.1f} {r['ops_per_sec']:>12.1f} {change:>+7.1f}%"
+                  f"   {o['p99_ms']} → {r['p99_ms']}")
+    for group, m in new.get("memory", {}).items():
+        o = old.get("memory", {}).get(group)
+        if o:
+            change = (m["bytes"] / o["bytes"] - 1) * 100
+            print(f"{group + '/store_memory (bytes)':44} {o['bytes']:>12} {m['bytes']:>12} {change:>+7.1f}%")
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1000,10000,100000", help="comma-separated guild sizes")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", help="earlier results JSON to diff against")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--check-plans", action="store_true", help="only run the EXPLAIN QUERY PLAN check")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    main.init_db()
+
+    if args.check_plans:
+        seed_for_plans(rng)
+        with main.db() as c:
+            failures = check_plans(c)
+        if failures:
+            print(f"\n{len(failures)} hot statement(s) scan a table or sort in a temp B-tree: {', '.join(failures)}")
+            sys.exit(1)
+        print("\nAll hot statements use an index.")
+        return
+
+    results: dict[str, dict] = {"render": bench_render(rng)}
+    memory: dict[str, dict] = {}
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        results[f"guild_{size}"] = bench_size(size, rng)
+        memory[f"guild_{size}"] = store_memory(size)
+
+    report = {
+        "created_at": main.now(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+        "memory": memory,
+    }
+    for group, rs in results.items():
+        for name, r in rs.items():
+            print(f"{group + '/' + name:44} {r['ops_per_sec']:>12.1f} ops/s   p50 {r['p50_ms']:.4f}ms   p99 {r['p99_ms']:.4f}ms")
+    for group, m in memory.items():
+        print(f"{group + '/store_memory':44} {m['bytes'] / 1e6:>12.2f} MB      {m['bytes_per_member']} bytes/member")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,10 +1,23 @@
-import os, time, sqlite3, io, asyncio, re, traceback, json, secrets
+import os, time, sqlite3, io, asyncio, re, traceback, json, secrets, heapq, sys, functools, hashlib, itertools, logging, threading
+import socket
+import cProfile, pstats, tracemalloc, contextvars
+from logging.handlers import RotatingFileHandler
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from datetime import datetime, timedelta, timezone
 
+import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 
+try:  # optional: notify pictures are only downscaled/recompressed when Pillow is installed
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
 
 # -------------------------
 # CONFIG
@@ -15,8 +28,11 @@ MIN_MESSAGE_CHARS = 4
 CHAT_COOLDOWN_SECONDS = 60
 CHAT_XP_PER_TICK = 1
 
-VC_CHECK_SECONDS = 60
 VC_MINUTES_PER_XP = 5  # 1 XP per 5 minutes
+VC_SECONDS_PER_XP = VC_MINUTES_PER_XP * 60
+VC_MIN_HUMANS = 2
+VC_CHECKPOINT_SECONDS = 600  # bank open voice sessions this often (bounds loss on crash)
+VC_RESUME_SECONDS = 300  # restarted within this (plus a checkpoint): members still in voice keep their session
 
 PER_MINUTE_XP_CAP = 2  # chat + vc combined
 
@@ -43,9 +59,44 @@ DB_PATH = os.getenv("XP_DB_PATH", "/app/data/xp.db")
 
 ROLE_SYNC_DEBOUNCE_SECONDS = 20
 
-# /audit throttling
-AUDIT_SLEEP_EVERY_MSGS = 250
-AUDIT_SLEEP_SECONDS = 1
+# Prometheus-style metrics endpoint (GET /metrics); 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Event-loop stall detection (structured "phoenixp.loop" log lines + metrics)
+LOOP_LAG_SAMPLE_SECONDS = 0.5
+LOOP_STALL_SECONDS = float(os.getenv("LOOP_STALL_SECONDS", "0.25"))  # lag that counts as a stall
+LOOP_DEBUG = os.getenv("LOOP_DEBUG") == "1"  # asyncio debug mode: also logs slow callbacks (adds overhead)
+
+# /profile (cProfile + tracemalloc window, nothing enabled outside it)
+PROFILE_MAX_SECONDS = 120
+
+# Slash command sync: only when the tree's payload hash changes. Set a guild id to sync there
+# instead (instant, for iterating on commands in a test server).
+COMMAND_SYNC_GUILD_ID = int(os.getenv("COMMAND_SYNC_GUILD_ID", "0"))
+
+# Sharding: 0 = one unsharded Bot. With SHARD_COUNT=N the bot is an AutoShardedBot and SHARD_IDS
+# ("0-3", "0,2"; unset = all N) picks this process's shards. Run one process per range on the same DB.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = os.getenv("SHARD_IDS", "")
+LEASE_SECONDS = 90  # cross-guild work moves to another process this long after its holder stops renewing
+
+# Command traces (one JSON line per traced command, rotated)
+TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(os.path.dirname(DB_PATH), "traces.jsonl"))
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+
+# /audit history downloads into the local archive (paced by the REST governor)
+AUDIT_BATCH_MSGS = 250  # archive rows written per DB transaction
+
+# XP ledger (append-only history of every XP change)
+XP_LEDGER_FLUSH_SECONDS = 30  # activity rollup flush + housekeeping check
+XP_LEDGER_RETENTION_DAYS = 90   # older events collapse into one snapshot row per user
+XP_LEDGER_COMPACT_HOURS = 24
+
+# Activity archive (what /audit recomputes from)
+ARCHIVE_FLUSH_ROWS = 200
+ARCHIVE_FLUSH_SECONDS = 5
 
 ANNOUNCE_CHANNEL_NAME = "📢announcements"
 
@@ -53,16 +104,27 @@ ANNOUNCE_CHANNEL_NAME = "📢announcements"
 NOTIFY_IMAGE_WAIT_SECONDS = 60
 NOTIFY_MAX_IMAGE_BYTES = 8 * 1024 * 1024  # 8MB safety cap
 NOTIFY_MAX_IMAGES = 10  # Discord single-message attachment limit
-
-# Throttles
-ROLE_SYNC_SLEEP_EVERY_EDITS = 8
-ROLE_SYNC_SLEEP_SECONDS = 1.0
+NOTIFY_IMAGE_MAX_DIM = int(os.getenv("NOTIFY_IMAGE_MAX_DIM", "2048"))  # longest side after preprocessing; 0 = keep size
+NOTIFY_IMAGE_WORKERS = 2
+NOTIFY_IMAGE_TIMEOUT_SECONDS = 30
+DM_DEDUPE_HOURS = 24  # a repeated campaign skips members it already reached within this window
+
+# Outbound REST budget (one governor for role edits, DMs, channel posts/edits, history pages).
+# Token-wide budgets (global, DMs, history, countdown) are split across shard processes.
+REST_GLOBAL_PER_SECOND = 40                # stays under Discord's 50/s global limit
+REST_ROLE_EDITS_PER_MINUTE = 480           # per guild; the old pace of 8 edits then a 1s pause
+REST_DMS_PER_MINUTE = 90
+REST_CHANNEL_MESSAGES_PER_MINUTE = 60      # posts/edits per channel
+REST_HISTORY_PAGES_PER_MINUTE = 120        # 100 messages per page
 
 # Poll config
 POLL_MAX_OPTIONS = 10                 # fits button UI nicely
 POLL_MIN_MINUTES = 1                  # minimum duration
 POLL_MAX_DAYS = 14                    # safety cap (in days)
-POLL_CLOSE_CHECK_SECONDS = 20         # close sweep interval
+POLL_CLOSE_CONCURRENCY = 8            # channels edited in parallel when many polls end together
+POLL_CLOSE_RETRY_SECONDS = 30         # a failed close tick retries its polls after this
+RENDER_CACHE_SIZE = 512               # rendered notify/poll fragments kept (LRU)
+POLL_COUNTDOWN_EDITS_PER_MINUTE = int(os.getenv("POLL_COUNTDOWN_EDITS_PER_MINUTE", "30"))  # across all guilds
 
 
 # -------------------------
@@ -138,6 +200,104 @@ def auto_bold_phrases(text: str) -> str:
     return text
 
 
+# -------------------------
+# RENDER CACHE (bolded fragments keyed by their source text, bounded LRU)
+# -------------------------
+class _RenderCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict[tuple, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, build) -> str:
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            value = self._items[key] = build()
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return value
+        self.hits += 1
+        self._items.move_to_end(key)
+        return value
+
+    def discard(self, *keys: tuple) -> None:
+        for key in keys:
+            self._items.pop(key, None)
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100.0) if total else 0.0
+        return f"{self.hits} hits / {self.misses} misses ({rate:.1f}%), {len(self._items)}/{self.maxsize} entries"
+
+
+_render_cache = _RenderCache(RENDER_CACHE_SIZE)
+
+
+# -------------------------
+# NOTIFY IMAGE PREPROCESSING (sniffed by magic bytes, downscaled off-loop)
+# -------------------------
+_IMAGE_EXT = {"png": "png", "jpeg": "jpg", "gif": "gif", "webp": "webp"}
+_image_pool: ProcessPoolExecutor | None = None
+_image_bytes_in = 0
+_image_bytes_saved = 0
+
+
+def image_kind(data: bytes) -> str | None:
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _preprocess_image(data: bytes, kind: str, max_dim: int) -> bytes:
+    """Runs in a worker process. Returns the smaller of the original and the re-encoded image."""
+    with Image.open(io.BytesIO(data)) as im:
+        if getattr(im, "is_animated", False):
+            return data
+        # phone photos store rotation in EXIF, which the re-encode drops: bake it into the pixels
+        im = ImageOps.exif_transpose(im)
+        if max_dim and max(im.size) > max_dim:
+            im.thumbnail((max_dim, max_dim))
+        out = io.BytesIO()
+        if kind == "jpeg":
+            im.convert("RGB").save(out, "JPEG", quality=85, optimize=True, progressive=True)
+        elif kind == "webp":
+            im.save(out, "WEBP", quality=85, method=4)
+        else:
+            im.save(out, kind.upper(), optimize=True)
+    smaller = out.getvalue()
+    return smaller if len(smaller) < len(data) else data
+
+
+async def preprocess_image(data: bytes, kind: str) -> bytes:
+    global _image_pool, _image_bytes_in, _image_bytes_saved
+    _image_bytes_in += len(data)
+    if Image is None or kind == "gif":
+        return data
+    if _image_pool is None:
+        # spawn, not fork: forking would copy locks held by the watchdog and asyncio threads.
+        # Workers re-import this script as __mp_main__, which the __main__ guard keeps inert.
+        _image_pool = ProcessPoolExecutor(NOTIFY_IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    loop = asyncio.get_running_loop()
+    try:
+        out = await asyncio.wait_for(
+            loop.run_in_executor(_image_pool, _preprocess_image, data, kind, NOTIFY_IMAGE_MAX_DIM),
+            NOTIFY_IMAGE_TIMEOUT_SECONDS,
+        )
+    except Exception:
+        return data
+    _image_bytes_saved += len(data) - len(out)
+    return out
+
+
 def _is_image_attachment(a: discord.Attachment) -> bool:
     ct = (a.content_type or "").lower()
     name = (a.filename or "").lower()
@@ -174,17 +334,457 @@ def _dedupe_filename(existing: set[str], desired: str) -> str:
 # -------------------------
 # DISCORD
 # -------------------------
+def parse_shard_ids(spec: str, count: int) -> list[int] | None:
+    if not count or not spec.strip():
+        return None
+    ids: set[int] = set()
+    for part in spec.split(","):
+        lo, _, hi = part.strip().partition("-")
+        ids.update(range(int(lo), int(hi or lo) + 1))
+    if not ids or min(ids) < 0 or max(ids) >= count:
+        raise RuntimeError(f"SHARD_IDS {spec!r} must be within 0-{count - 1}")
+    return sorted(ids)
+
+
+_shard_ids = parse_shard_ids(SHARD_IDS, SHARD_COUNT)
+
+
+def owns_guild(guild_id: int) -> bool:
+    """True if this process's shards carry the guild (Discord routes by (guild_id >> 22) % shard_count)."""
+    return _shard_ids is None or (guild_id >> 22) % SHARD_COUNT in _shard_ids
+
+
+def process_share(limit: float) -> float:
+    """This process's slice of a per-token limit: the fraction of all shards it runs."""
+    return limit if _shard_ids is None else limit * len(_shard_ids) / SHARD_COUNT
+
+
+# 429s are counted from the HTTP responses themselves (see REST GOVERNOR)
+_http_trace = aiohttp.TraceConfig()
+
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.voice_states = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=_shard_ids, http_trace=_http_trace
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, http_trace=_http_trace)
+
+# -------------------------
+# METRICS (in-process histograms/counters, served as Prometheus text)
+# -------------------------
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_metrics: list = []
+
+
+def _label_text(labels: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = _LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        row = self.series.get(key)
+        if row is None:
+            row = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, row in self.series.items():
+            for le, n in zip(self.buckets, row):
+                out.append(f"{self.name}_bucket{_label_text(key, 'le=' + json.dumps(str(le)))} {n}")
+            out.append(f"{self.name}_bucket{_label_text(key, 'le=' + json.dumps('+Inf'))} {row[-1]}")
+            out.append(f"{self.name}_sum{_label_text(key)} {row[-2]:.6f}")
+            out.append(f"{self.name}_count{_label_text(key)} {row[-1]}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, kind: str = "counter", read=None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind  # "gauge" for values that go down
+        self.read = read  # optional callable sampled at scrape time
+        self.series: dict[tuple, float] = {}
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        series = self.series if self.read is None else {(): self.read()}
+        for key, v in series.items():
+            out.append(f"{self.name}{_label_text(key)} {v}")
+        return out
+
+
+def timed(hist: Histogram, **labels):
+    """Decorator: observe an async function's wall time."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def inner(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - t, **labels)
+        return inner
+    return wrap
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for m in _metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+async def _metrics_handler(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render_metrics().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+_metrics_server: asyncio.AbstractServer | None = None
+
+
+async def start_metrics_server() -> None:
+    global _metrics_server
+    if METRICS_PORT and _metrics_server is None:
+        _metrics_server = await asyncio.start_server(_metrics_handler, METRICS_HOST, METRICS_PORT)
+
+
+ON_MESSAGE_SECONDS = Histogram("phoenixp_on_message_seconds", "on_message handling time")
+DB_LOCK_WAIT_SECONDS = Histogram("phoenixp_db_lock_wait_seconds", "Time spent waiting for DB_LOCK")
+DB_LOCK_HOLD_SECONDS = Histogram("phoenixp_db_lock_hold_seconds", "Time DB_LOCK was held")
+DB_QUERY_SECONDS = Histogram("phoenixp_db_query_seconds", "SQLite statement latency by verb and table")
+ROLE_SYNC_SECONDS = Histogram("phoenixp_role_sync_seconds", "sync_all_roles duration")
+ROLE_SYNC_EDITS = Counter("phoenixp_role_sync_edits_total", "Members whose rank role was changed, by result")
+LOOP_TICK_SECONDS = Histogram("phoenixp_loop_tick_seconds", "Background loop tick duration")
+DMS_TOTAL = Counter("phoenixp_dms_total", "DMs attempted, by campaign kind and result")
+
+
+class TimedLock(asyncio.Lock):
+    """asyncio.Lock that records wait and hold times."""
+
+    _held_at = 0.0
+
+    async def acquire(self) -> bool:
+        t = time.perf_counter()
+        await super().acquire()
+        self._held_at = time.perf_counter()
+        DB_LOCK_WAIT_SECONDS.observe(self._held_at - t)
+        return True
+
+    def release(self) -> None:
+        DB_LOCK_HOLD_SECONDS.observe(time.perf_counter() - self._held_at)
+        super().release()
+
+
+_SQL_TABLE_RE = re.compile(r"(?is)\b(?:FROM|INTO|UPDATE|TABLE(?: IF NOT EXISTS)?|INDEX(?: IF NOT EXISTS)? \w+ ON)\s+(\w+)")
+
+
+@functools.lru_cache(maxsize=512)
+def _sql_label(sql: str) -> tuple[str, str]:
+    verb = (sql.split(None, 1) or ["?"])[0].upper()
+    m = _SQL_TABLE_RE.search(sql)
+    return verb, (m.group(1) if m else "-")
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that records per-statement latency (verb + table).
+
+    It also remembers which guilds' XP stores the open transaction wrote to: their columns
+    change before the commit, so a rollback drops them and they reload from SQLite.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dirty_stores: set[int] = set()
+
+    def _drop_dirty_stores(self) -> None:
+        for gid in self.dirty_stores:
+            _xp_stores.pop(gid, None)
+        self.dirty_stores.clear()
+
+    def execute(self, sql, *args):
+        t = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            verb, table = _sql_label(sql)
+            DB_QUERY_SECONDS.observe(time.perf_counter() - t, verb=verb, table=table)
+
+    def executemany(self, sql, *args):
+        t = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            verb, table = _sql_label(sql)
+            DB_QUERY_SECONDS.observe(time.perf_counter() - t, verb=verb, table=table)
+
+    def commit(self):
+        t = time.perf_counter()
+        try:
+            super().commit()
+            self.dirty_stores.clear()
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - t, verb="COMMIT", table="-")
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._drop_dirty_stores()
+
+    def __exit__(self, exc_type, exc, tb):
+        # the C-level context manager commits/rolls back without going through the methods above
+        try:
+            result = super().__exit__(exc_type, exc, tb)
+        except BaseException:  # commit failed and was rolled back
+            self._drop_dirty_stores()
+            raise
+        if exc_type is None:
+            self.dirty_stores.clear()
+        else:
+            self._drop_dirty_stores()
+        return result
+
+
+# -------------------------
+# LOOP LAG MONITOR (sampler task + watchdog thread that captures the stalled stack)
+# -------------------------
+LOOP_LAG_SECONDS = Histogram("phoenixp_loop_lag_seconds", "Event loop lag measured by the sampler")
+LOOP_STALLS = Counter("phoenixp_loop_stalls_total", "Event loop stalls over LOOP_STALL_SECONDS")
+_loop_log = logging.getLogger("phoenixp.loop")
+
+
+class LoopLagMonitor:
+    def __init__(self):
+        self.expected_at = 0.0  # monotonic time the sampler should wake next
+        self.loop_thread_id: int | None = None
+        self.reported_for = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        if LOOP_DEBUG:
+            loop.set_debug(True)
+            loop.slow_callback_duration = LOOP_STALL_SECONDS
+        self.loop_thread_id = threading.get_ident()
+        self.expected_at = time.monotonic() + LOOP_LAG_SAMPLE_SECONDS
+        self._task = asyncio.create_task(self._sample())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    async def _sample(self) -> None:
+        while True:
+            await asyncio.sleep(LOOP_LAG_SAMPLE_SECONDS)
+            t = time.monotonic()
+            lag = max(0.0, t - self.expected_at)
+            self.expected_at = t + LOOP_LAG_SAMPLE_SECONDS
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= LOOP_STALL_SECONDS:
+                _loop_log.warning(json.dumps({"event": "loop_lag", "lag_ms": round(lag * 1000, 1)}))
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(LOOP_STALL_SECONDS / 2)
+            expected = self.expected_at
+            stalled = time.monotonic() - expected
+            if stalled < LOOP_STALL_SECONDS or self.reported_for == expected:
+                continue
+            self.reported_for = expected  # one report per stall
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            ours = [f for f in stack if f.filename == __file__]
+            self.stalls += 1
+            LOOP_STALLS.inc()
+            _loop_log.warning(json.dumps({
+                "event": "loop_stall",
+                "stalled_ms": round(stalled * 1000, 1),
+                "handler": f"{ours[-1].name}:{ours[-1].lineno}" if ours else None,
+                "stack": [f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in stack[-12:]],
+            }))
+
+    def stats(self) -> str:
+        return f"last {self.last_lag * 1000:.0f}ms, max {self.max_lag * 1000:.0f}ms, stalls {self.stalls}"
+
+
+loop_monitor = LoopLagMonitor()
+
+
+# -------------------------
+# COMMAND TRACING (phase spans per invocation -> rotating JSONL)
+# -------------------------
+class Trace:
+    def __init__(self, command: str, guild_id: int | None):
+        self.command = command
+        self.guild_id = guild_id
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float, float]] = []  # (path, start offset, duration)
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("trace", default=None)
+_span_path: contextvars.ContextVar[tuple[str, ...]] = contextvars.ContextVar("span_path", default=())
+_trace_totals: dict[str, dict[str, list[float]]] = {}  # command -> span path -> [count, total seconds]
+_trace_log: logging.Logger | None = None
+
+
+class span:
+    """`with span("db_read"):` records a phase into the current trace; a no-op outside one."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.token = _span_path.set(_span_path.get() + (self.name,))
+            self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            path = "/".join(_span_path.get())
+            _span_path.reset(self.token)
+            self.trace.spans.append((path, self.t - self.trace.started, time.perf_counter() - self.t))
+        return False
+
+
+def _write_trace(trace: Trace, total: float, error: str | None) -> None:
+    global _trace_log
+    summary: dict[str, float] = {}
+    totals = _trace_totals.setdefault(trace.command, {})
+    for path, _, dur in trace.spans:
+        summary[path] = summary.get(path, 0.0) + dur
+    for path, dur in summary.items():
+        acc = totals.setdefault(path, [0, 0.0])
+        acc[0] += 1
+        acc[1] += dur
+    top_level = {p: d for p, d in summary.items() if "/" not in p}
+
+    if _trace_log is None:
+        _ensure_db_dir()
+        handler = RotatingFileHandler(TRACE_PATH, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _trace_log = logging.getLogger("phoenixp.trace")
+        _trace_log.setLevel(logging.INFO)
+        _trace_log.propagate = False
+        _trace_log.addHandler(handler)
+
+    _trace_log.info(json.dumps({
+        "ts": now(),
+        "command": trace.command,
+        "guild_id": trace.guild_id,
+        "total_ms": round(total * 1000, 1),
+        "slowest": max(top_level, key=top_level.get) if top_level else None,
+        "summary_ms": {p: round(d * 1000, 1) for p, d in summary.items()},
+        "spans": [{"name": p, "start_ms": round(st * 1000, 1), "ms": round(d * 1000, 1)} for p, st, d in trace.spans],
+        "error": error,
+    }))
+
+
+async def _run_traced(trace: Trace, keep_empty: bool, fn, *args, **kwargs):
+    token = _current_trace.set(trace)
+    error = None
+    try:
+        return await fn(*args, **kwargs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_trace.reset(token)
+        if keep_empty or trace.spans or error:
+            try:
+                _write_trace(trace, time.perf_counter() - trace.started, error)
+            except Exception:
+                traceback.print_exc()
+
+
+def traced(command: str):
+    """Decorator for slash command callbacks: one Trace per invocation, written when it returns."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def inner(interaction: discord.Interaction, *args, **kwargs):
+            trace = Trace(command, interaction.guild.id if interaction.guild else None)
+            return await _run_traced(trace, True, fn, interaction, *args, **kwargs)
+        return inner
+    return wrap
+
+
+def traced_loop(name: str):
+    """Decorator for background loop ticks: one Trace per tick as `loop:<name>`; idle ticks (no spans) aren't written."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def inner(*args, **kwargs):
+            return await _run_traced(Trace(f"loop:{name}", None), False, fn, *args, **kwargs)
+        return inner
+    return wrap
+
+
+def trace_summary() -> list[str]:
+    out = []
+    for command, totals in sorted(_trace_totals.items()):
+        top = [(p, acc) for p, acc in totals.items() if "/" not in p]
+        if not top:
+            continue
+        path, (n, total) = max(top, key=lambda kv: kv[1][1] / kv[1][0])
+        label = command if command.startswith("loop:") else f"/{command}"
+        out.append(f"{label}: slowest phase {path} (avg {total / n * 1000:.0f}ms over {n})")
+    return out
+
 
 # -------------------------
 # GLOBAL LOCKS
 # -------------------------
-DB_LOCK = asyncio.Lock()
+DB_LOCK = TimedLock()
 _role_sync_tasks: dict[int, asyncio.Task] = {}
+_channel_edit_locks: dict[int, asyncio.Lock] = {}
 
 
 # -------------------------
@@ -211,7 +811,7 @@ def _ensure_db_dir():
 
 def db():
     _ensure_db_dir()
-    c = sqlite3.connect(DB_PATH, timeout=30)
+    c = sqlite3.connect(DB_PATH, timeout=30, factory=TimedConnection)
     c.row_factory = sqlite3.Row
     c.execute("PRAGMA journal_mode=WAL;")
     c.execute("PRAGMA synchronous=NORMAL;")
@@ -219,87 +819,300 @@ def db():
     return c
 
 
-def init_db():
-    with db() as c:
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            guild_id INTEGER,
-            user_id INTEGER,
-            xp INTEGER DEFAULT 0,
-            last_active INTEGER DEFAULT 0,
-            chat_cooldown INTEGER DEFAULT 0,
-            last_minute INTEGER DEFAULT 0,
-            earned_this_minute INTEGER DEFAULT 0,
-            vc_minutes INTEGER DEFAULT 0,
-            PRIMARY KEY (guild_id, user_id)
-        )
-        """)
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS meta (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )
-        """)
-        c.execute("CREATE INDEX IF NOT EXISTS idx_users_guild_xp ON users(guild_id, xp DESC, user_id ASC)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_users_guild_last_active ON users(guild_id, last_active)")
+# -------------------------
+# SCHEMA MIGRATIONS (PRAGMA user_version = number of steps applied)
+# -------------------------
+def _m001_baseline(c: sqlite3.Connection) -> None:
+    """Bring a new or unversioned database up to the schema init_db built before versions existed.
 
-        # ---- Poll tables (anonymous voting, no swaps, results revealed at end) ----
+    Idempotent: tables and indexes are created if missing and superseded indexes dropped;
+    columns (vc_seconds, decay_through) are added and backfilled, and the ledger snapshot and
+    poll tallies seeded, only when they are absent.
+    """
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        guild_id INTEGER,
+        user_id INTEGER,
+        xp INTEGER DEFAULT 0,
+        last_active INTEGER DEFAULT 0,
+        chat_cooldown INTEGER DEFAULT 0,
+        last_minute INTEGER DEFAULT 0,
+        earned_this_minute INTEGER DEFAULT 0,
+        vc_minutes INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    # voice time is banked to the second (vc_minutes is the old per-tick counter)
+    user_cols = {r["name"] for r in c.execute("PRAGMA table_info(users)").fetchall()}
+    if "vc_seconds" not in user_cols:
+        c.execute("ALTER TABLE users ADD COLUMN vc_seconds INTEGER DEFAULT 0")
+        c.execute("UPDATE users SET vc_seconds = vc_minutes * 60")
+    # decay is applied lazily; everything before this column existed was already decayed
+    if "decay_through" not in user_cols:
+        c.execute("ALTER TABLE users ADD COLUMN decay_through INTEGER DEFAULT 0")
+        c.execute("UPDATE users SET decay_through=?", (now(),))
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS vc_sessions (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        started_at INTEGER NOT NULL,   -- start of the not-yet-credited stretch
+        PRIMARY KEY (guild_id, user_id)
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS activity_archive (
+        message_id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        author_id INTEGER NOT NULL,
+        created_at INTEGER NOT NULL,
+        content_len INTEGER NOT NULL,   -- len(content.strip())
+        is_bot INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_guild_time ON activity_archive(guild_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_channel ON activity_archive(channel_id)")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS xp_events (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        xp_after INTEGER NOT NULL,
+        reason TEXT NOT NULL        -- chat/vc/audit/decay/set/reset/snapshot
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_xp_events_user_ts ON xp_events(guild_id, user_id, ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_xp_events_ts ON xp_events(ts)")
+    if meta_get(c, "xp_ledger_seeded") is None:
+        # history starts here: one snapshot per user with XP
         c.execute("""
-        CREATE TABLE IF NOT EXISTS polls (
-            poll_id TEXT PRIMARY KEY,
-            guild_id INTEGER NOT NULL,
-            channel_id INTEGER NOT NULL,
-            message_id INTEGER NOT NULL,
-            created_by INTEGER NOT NULL,
-            created_at INTEGER NOT NULL,
-            ends_at INTEGER NOT NULL,
-            question TEXT NOT NULL,
-            options_json TEXT NOT NULL,
-            ping_mode TEXT NOT NULL DEFAULT 'none',   -- none/here/everyone/role
-            role_id INTEGER DEFAULT NULL,             -- for role ping
-            dm_enabled INTEGER NOT NULL DEFAULT 0,     -- 0/1
-            closed INTEGER NOT NULL DEFAULT 0          -- 0/1
-        )
-        """)
+            INSERT INTO xp_events (guild_id, user_id, ts, delta, xp_after, reason)
+            SELECT guild_id, user_id, ?, xp, xp, 'snapshot' FROM users WHERE xp>0
+        """, (now(),))
+        meta_set(c, "xp_ledger_seeded", now())
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS activity_daily (
+        guild_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,              -- UTC day number (ts // 86400)
+        user_id INTEGER NOT NULL,
+        chat_ticks INTEGER NOT NULL DEFAULT 0,
+        vc_seconds INTEGER NOT NULL DEFAULT 0,
+        xp_gained INTEGER NOT NULL DEFAULT 0,
+        xp_decayed INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, day, user_id)
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_user_day ON activity_daily(guild_id, user_id, day)")
+    # rankings and decay read the in-memory store; these only cost a write per XP change
+    c.execute("DROP INDEX IF EXISTS idx_users_guild_xp")
+    c.execute("DROP INDEX IF EXISTS idx_users_guild_last_active")
+
+    # ---- Poll tables (anonymous voting, no swaps, results revealed at end) ----
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS polls (
+        poll_id TEXT PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        created_by INTEGER NOT NULL,
+        created_at INTEGER NOT NULL,
+        ends_at INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        options_json TEXT NOT NULL,
+        ping_mode TEXT NOT NULL DEFAULT 'none',   -- none/here/everyone/role
+        role_id INTEGER DEFAULT NULL,             -- for role ping
+        dm_enabled INTEGER NOT NULL DEFAULT 0,     -- 0/1
+        closed INTEGER NOT NULL DEFAULT 0          -- 0/1
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS poll_votes (
+        poll_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        option_index INTEGER NOT NULL,
+        voted_at INTEGER NOT NULL,
+        PRIMARY KEY (poll_id, user_id)
+    )
+    """)
+    # per-option vote counts, bumped in the same transaction as each vote
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS poll_tallies (
+        poll_id TEXT NOT NULL,
+        option_index INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (poll_id, option_index)
+    )
+    """)
+    # who each DM campaign reached, so a re-sent campaign skips them
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS dm_deliveries (
+        guild_id INTEGER NOT NULL,
+        campaign_key TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        sent_at INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, campaign_key, user_id)
+    )
+    """)
+    # partial: only open polls are ever looked up by guild or deadline
+    c.execute("DROP INDEX IF EXISTS idx_polls_guild_ends")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_polls_open ON polls(guild_id, ends_at) WHERE closed=0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dm_deliveries_sent ON dm_deliveries(sent_at)")
+
+    # one-time: seed tallies for votes cast before the table existed
+    if meta_get(c, "poll_tallies_backfilled") is None:
         c.execute("""
-        CREATE TABLE IF NOT EXISTS poll_votes (
-            poll_id TEXT NOT NULL,
-            user_id INTEGER NOT NULL,
-            option_index INTEGER NOT NULL,
-            voted_at INTEGER NOT NULL,
-            PRIMARY KEY (poll_id, user_id)
-        )
+            INSERT OR IGNORE INTO poll_tallies (poll_id, option_index, count)
+            SELECT poll_id, option_index, COUNT(*) FROM poll_votes GROUP BY poll_id, option_index
         """)
-        c.execute("CREATE INDEX IF NOT EXISTS idx_polls_guild_ends ON polls(guild_id, ends_at, closed)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_poll_votes_poll ON poll_votes(poll_id)")
-        c.commit()
+        meta_set(c, "poll_tallies_backfilled", now())
+
+
+def _m002_drop_poll_votes_poll_index(c: sqlite3.Connection) -> None:
+    # the (poll_id, user_id) primary key already serves every poll_id lookup
+    c.execute("DROP INDEX IF EXISTS idx_poll_votes_poll")
+
+
+def _m003_users_without_rowid(c: sqlite3.Connection) -> None:
+    # every read is by (guild_id, user_id): clustering on it drops the rowid tree and the separate key index.
+    # vc_minutes is gone too (banked into vc_seconds since the column was added).
+    c.execute("""
+    CREATE TABLE users_new (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        xp INTEGER NOT NULL DEFAULT 0,
+        last_active INTEGER NOT NULL DEFAULT 0,
+        decay_through INTEGER NOT NULL DEFAULT 0,
+        chat_cooldown INTEGER NOT NULL DEFAULT 0,
+        last_minute INTEGER NOT NULL DEFAULT 0,
+        earned_this_minute INTEGER NOT NULL DEFAULT 0,
+        vc_seconds INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID
+    """)
+    c.execute("""
+        INSERT INTO users_new
+        SELECT guild_id, user_id, COALESCE(xp, 0), COALESCE(last_active, 0), COALESCE(decay_through, 0),
+               COALESCE(chat_cooldown, 0), COALESCE(last_minute, 0), COALESCE(earned_this_minute, 0),
+               COALESCE(vc_seconds, 0)
+        FROM users WHERE guild_id IS NOT NULL AND user_id IS NOT NULL
+    """)
+    c.execute("DROP TABLE users")
+    c.execute("ALTER TABLE users_new RENAME TO users")
+
+
+# append only: a shipped step never changes, the fix is a new step
+MIGRATIONS = [
+    _m001_baseline,
+    _m002_drop_poll_votes_poll_index,
+    _m003_users_without_rowid,
+]
+
+
+def schema_version(c: sqlite3.Connection) -> int:
+    return c.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db() -> None:
+    """Apply pending migrations, each in its own transaction. Once at process start; a single PRAGMA when current."""
+    with db() as c:
+        if schema_version(c) >= len(MIGRATIONS):
+            return
+        c.isolation_level = None  # explicit BEGIN/COMMIT so DDL is inside the transaction too
+        while True:
+            c.execute("BEGIN IMMEDIATE")
+            version = schema_version(c)  # re-read under the write lock: another process may have migrated
+            if version >= len(MIGRATIONS):
+                c.execute("ROLLBACK")
+                return
+            try:
+                MIGRATIONS[version](c)
+                c.execute(f"PRAGMA user_version={version + 1}")
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+            print(f"Schema migrated to v{version + 1} ({MIGRATIONS[version].__name__})")
 
 
 def ensure_users_exist(c: sqlite3.Connection, gid: int, member_ids: list[int]) -> None:
-    if not member_ids:
-        return
-    c.executemany(
-        "INSERT INTO users (guild_id, user_id) VALUES (?, ?) "
-        "ON CONFLICT(guild_id, user_id) DO NOTHING",
-        [(gid, uid) for uid in member_ids],
-    )
+    xp_store(c, gid).ensure(c, member_ids)
 
 
-def get_user(c: sqlite3.Connection, gid: int, uid: int):
-    r = c.execute("SELECT * FROM users WHERE guild_id=? AND user_id=?", (gid, uid)).fetchone()
-    if r:
-        return r
-    c.execute(
-        "INSERT INTO users (guild_id, user_id) VALUES (?, ?) "
-        "ON CONFLICT(guild_id, user_id) DO NOTHING",
-        (gid, uid),
+def get_user(c: sqlite3.Connection, gid: int, uid: int) -> dict[str, int]:
+    return xp_store(c, gid).get(c, uid)
+
+
+# -------------------------
+# HOT STATEMENTS (run per event, command or loop tick; bench.py --check-plans EXPLAINs each one)
+# -------------------------
+SQL_USERS_LOAD = "SELECT user_id, {cols} FROM users WHERE guild_id=?"
+SQL_USERS_UPDATE = "UPDATE users SET {sets} WHERE guild_id=? AND user_id=?"
+SQL_USERS_FILL = "UPDATE users SET {sets} WHERE guild_id=?"
+SQL_META_GET = "SELECT value FROM meta WHERE key=?"
+
+SQL_POLL_GET = "SELECT * FROM polls WHERE poll_id=?"
+SQL_POLL_VOTE = "INSERT INTO poll_votes (poll_id, user_id, option_index, voted_at) VALUES (?,?,?,?)"
+SQL_POLL_TALLY_BUMP = (
+    "INSERT INTO poll_tallies (poll_id, option_index, count) VALUES (?,?,1) "
+    "ON CONFLICT(poll_id, option_index) DO UPDATE SET count=count+1"
+)
+SQL_POLL_TALLIES = "SELECT option_index, count FROM poll_tallies WHERE poll_id=?"
+SQL_POLLS_OPEN = "SELECT * FROM polls WHERE closed=0"
+SQL_POLLS_OPEN_GUILD = "SELECT * FROM polls WHERE guild_id=? AND closed=0 ORDER BY ends_at ASC"
+SQL_POLLS_DUE = "SELECT * FROM polls WHERE closed=0 AND poll_id IN ({placeholders})"
+SQL_POLL_CLAIM_CLOSE = "UPDATE polls SET closed=1 WHERE poll_id=? AND closed=0"
+
+SQL_XP_AT = (
+    "SELECT xp_after FROM xp_events WHERE guild_id=? AND user_id=? AND ts<=? "
+    "ORDER BY ts DESC, rowid DESC LIMIT 1"
+)
+SQL_XP_HISTORY = """
+    SELECT ts, delta, xp_after, reason FROM xp_events
+    WHERE guild_id=? AND user_id=? AND ts>?
+    ORDER BY ts DESC, rowid DESC LIMIT 15
+"""
+# keeps each user's last row by (ts, rowid): a decay row and the change after it share one ts
+SQL_LEDGER_COMPACT = """
+    DELETE FROM xp_events AS e
+    WHERE ts < ? AND rowid != (
+        SELECT rowid FROM xp_events
+        WHERE guild_id=e.guild_id AND user_id=e.user_id AND ts < ?
+        ORDER BY ts DESC, rowid DESC LIMIT 1
     )
-    c.commit()
-    return c.execute("SELECT * FROM users WHERE guild_id=? AND user_id=?", (gid, uid)).fetchone()
+"""
+SQL_LEDGER_SNAPSHOT = "UPDATE xp_events SET reason='snapshot', delta=xp_after WHERE ts < ? AND reason != 'snapshot'"
+
+SQL_ACTIVITY_GUILD = """
+    SELECT user_id, chat_ticks, vc_seconds, xp_gained, xp_decayed
+    FROM activity_daily WHERE guild_id=? AND day>=?
+"""
+SQL_ACTIVITY_MEMBER = """
+    SELECT user_id, SUM(chat_ticks) AS chat, SUM(vc_seconds) AS vc,
+           SUM(xp_gained) AS gained, SUM(xp_decayed) AS decayed
+    FROM activity_daily WHERE guild_id=? AND day>=? AND user_id=?
+"""
+SQL_ARCHIVE_CHANNEL_HEAD = "SELECT MAX(message_id) AS m FROM activity_archive WHERE channel_id=?"
+SQL_ARCHIVE_SINCE = """
+    SELECT author_id, created_at, content_len, is_bot FROM activity_archive
+    WHERE guild_id=? AND created_at>=?
+    ORDER BY created_at, message_id
+"""
+
+SQL_DM_SENT = "SELECT user_id FROM dm_deliveries WHERE guild_id=? AND campaign_key=? AND sent_at>=?"
+SQL_DM_PRUNE = "DELETE FROM dm_deliveries WHERE sent_at < ?"
+SQL_VC_CLOSE = "DELETE FROM vc_sessions WHERE guild_id=? AND user_id=?"
+SQL_VC_CHECKPOINT = "UPDATE vc_sessions SET started_at=? WHERE guild_id=? AND user_id=?"
 
 
 def meta_get(c: sqlite3.Connection, key: str, default=None):
-    r = c.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+    r = c.execute(SQL_META_GET, (key,)).fetchone()
     return r["value"] if r else default
 
 
@@ -307,17 +1120,40 @@ def meta_set(c: sqlite3.Connection, key: str, value):
     c.execute("INSERT OR REPLACE INTO meta VALUES (?,?)", (key, str(value)))
 
 
+# -------------------------
+# LEASES (work spanning every guild runs on one process at a time)
+# -------------------------
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(name: str, ttl: int = LEASE_SECONDS) -> bool:
+    """Take or renew meta `lease:<name>` if it is free, expired or already ours. Renew well inside ttl."""
+    key = f"lease:{name}"
+    ts = now()
+    with db() as c:
+        c.isolation_level = None
+        c.execute("BEGIN IMMEDIATE")  # read-then-write must not interleave with another process
+        try:
+            owner, _, expires = str(meta_get(c, key, "")).rpartition(" ")
+            held_elsewhere = owner not in ("", PROCESS_ID) and int(expires or 0) > ts
+            if not held_elsewhere:
+                meta_set(c, key, f"{PROCESS_ID} {ts + ttl}")
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+    return not held_elsewhere
+
+
 def reset_audit_state(c: sqlite3.Connection, gid: int):
-    c.execute("""
-        UPDATE users
-        SET chat_cooldown=0, last_minute=0, earned_this_minute=0
-        WHERE guild_id=?
-    """, (gid,))
+    xp_store(c, gid).fill(c, chat_cooldown=0, last_minute=0, earned_this_minute=0)
 
 
 def has_prime(m: discord.Member) -> bool:
-    role_names = {r.name for r in m.roles}
-    return any(name in role_names for name in MANUAL_PRIME_ROLES)
+    members = _prime_members.get(m.guild.id)
+    if members is None:  # guild not indexed yet
+        return any(r.name in MANUAL_PRIME_ROLES for r in m.roles)
+    return m.id in members
 
 
 def is_admin(i: discord.Interaction) -> bool:
@@ -332,133 +1168,737 @@ async def fetch_members(guild: discord.Guild) -> dict[int, discord.Member]:
     return out
 
 
+def _dm_summary(sent: int, failed: int, skipped: int) -> str:
+    if skipped and not sent and not failed:
+        return (
+            f"DMs: none sent. Duplicate: this exact message already reached all {skipped} member(s) "
+            f"in the last {DM_DEDUPE_HOURS}h."
+        )
+    text = f"DMs: {sent} sent, {failed} failed"
+    if skipped:
+        text += f", {skipped} skipped as duplicates (already sent this exact message in the last {DM_DEDUPE_HOURS}h)"
+    return text
+
+
 def get_announce_channel(guild: discord.Guild):
     return discord.utils.get(guild.text_channels, name=ANNOUNCE_CHANNEL_NAME)
 
 
 # -------------------------
-# XP CORE
+# MEMBER INDEXES (built from the guild cache on ready, kept current from gateway events)
 # -------------------------
-def award_xp(c: sqlite3.Connection, gid: int, uid: int, amount: int, ts: int) -> int:
-    u = get_user(c, gid, uid)
-    bucket = minute_bucket(ts)
+_prime_role_ids: dict[int, set[int]] = {}           # guild_id -> ids of roles named in MANUAL_PRIME_ROLES
+_prime_members: dict[int, set[int]] = {}            # guild_id -> member ids holding any of them
+_role_members: dict[int, dict[int, set[int]]] = {}  # guild_id -> role_id -> human member ids
+_human_members: dict[int, set[int]] = {}            # guild_id -> non-bot member ids
 
-    earned = int(u["earned_this_minute"])
-    if bucket != int(u["last_minute"]):
-        earned = 0
 
-    award = max(0, min(int(amount), PER_MINUTE_XP_CAP - earned))
-    if not award:
-        return 0
+def index_prime_roles(guild: discord.Guild) -> None:
+    role_ids = {r.id for r in guild.roles if r.name in MANUAL_PRIME_ROLES}
+    _prime_role_ids[guild.id] = role_ids
+    _prime_members[guild.id] = {m.id for r in guild.roles if r.id in role_ids for m in r.members}
 
-    c.execute("""
-        UPDATE users
-        SET xp=?, last_active=?, last_minute=?, earned_this_minute=?
-        WHERE guild_id=? AND user_id=?
-    """, (clamp_xp(int(u["xp"]) + award), ts, bucket, earned + award, gid, uid))
-    return award
 
+def index_guild_members(guild: discord.Guild) -> None:
+    humans: set[int] = set()
+    by_role: dict[int, set[int]] = {}
+    for m in guild.members:
+        if m.bot:
+            continue
+        humans.add(m.id)
+        for r in m.roles:
+            by_role.setdefault(r.id, set()).add(m.id)
+    _human_members[guild.id] = humans
+    _role_members[guild.id] = by_role
+    index_prime_roles(guild)
 
-# -------------------------
-# RANKING (TOP-X)
-# -------------------------
-def compute_rank_map(gid: int, member_ids: list[int]) -> dict[int, str]:
-    if not member_ids:
-        return {}
 
-    with db() as c:
-        placeholders = ",".join("?" for _ in member_ids)
-        rows = c.execute(
-            f"SELECT user_id, xp FROM users WHERE guild_id=? AND user_id IN ({placeholders})",
-            (gid, *member_ids),
-        ).fetchall()
+def _update_prime_member(m: discord.Member) -> None:
+    members = _prime_members.get(m.guild.id)
+    if members is None:
+        return
+    role_ids = _prime_role_ids.get(m.guild.id, set())
+    if any(r.id in role_ids for r in m.roles):
+        members.add(m.id)
+    else:
+        members.discard(m.id)
 
-    xp_map = {int(r["user_id"]): int(r["xp"]) for r in rows}
 
-    eligible = [(uid, xp_map.get(uid, 0)) for uid in member_ids if xp_map.get(uid, 0) >= INITIATE_EXIT_XP]
-    eligible.sort(key=lambda x: (-x[1], x[0]))
+def _update_member_roles(before: discord.Member, after: discord.Member) -> None:
+    by_role = _role_members.get(after.guild.id)
+    if by_role is None or after.bot:
+        return
+    old = {r.id for r in before.roles}
+    new = {r.id for r in after.roles}
+    for rid in old - new:
+        by_role.get(rid, set()).discard(after.id)
+    for rid in new - old:
+        by_role.setdefault(rid, set()).add(after.id)
 
-    topA = {uid for uid, _ in eligible[:TOP_ASCENDANT]}
-    nextE = {uid for uid, _ in eligible[TOP_ASCENDANT:TOP_ASCENDANT + NEXT_EMBER]}
 
-    out: dict[int, str] = {}
-    for uid in member_ids:
-        x = xp_map.get(uid, 0)
-        if x < INITIATE_EXIT_XP:
-            out[uid] = ROLE_INITIATE
-        elif uid in topA:
-            out[uid] = ROLE_ASCENDANT
-        elif uid in nextE:
-            out[uid] = ROLE_EMBER
-        else:
-            out[uid] = ROLE_OPERATIVE
+def _add_member(m: discord.Member) -> None:
+    if m.bot or m.guild.id not in _human_members:
+        return
+    _human_members[m.guild.id].add(m.id)
+    for r in m.roles:
+        _role_members[m.guild.id].setdefault(r.id, set()).add(m.id)
+
+
+def _remove_member(gid: int, uid: int) -> None:
+    _human_members.get(gid, set()).discard(uid)
+    _prime_members.get(gid, set()).discard(uid)
+    for ids in _role_members.get(gid, {}).values():
+        ids.discard(uid)
+
+
+async def resolve_dm_audience(guild: discord.Guild, ping_mode: str, role: discord.Role | None) -> list[discord.Member]:
+    """Members to DM for a ping mode; served from the index, REST fetch only before it is built."""
+    if ping_mode == "everyone":
+        ids = _human_members.get(guild.id)
+    elif ping_mode == "role" and role:
+        by_role = _role_members.get(guild.id)
+        ids = by_role.get(role.id, set()) if by_role is not None else None
+    else:
+        return []
+
+    if ids is None:  # guild not indexed yet
+        members = await fetch_members(guild)
+        if ping_mode == "everyone":
+            return list(members.values())
+        return [m for m in members.values() if any(r.id == role.id for r in m.roles)]
+
+    out = []
+    for uid in ids:
+        m = guild.get_member(uid)
+        if m is not None:
+            out.append(m)
     return out
 
 
-def display_rank(m: discord.Member, computed: str) -> str:
-    return f"Prime + {computed}" if has_prime(m) else computed
+async def dm_pending(gid: int, campaign_key: str, targets: list[discord.Member]) -> list[discord.Member]:
+    """Drop members this campaign already reached within DM_DEDUPE_HOURS."""
+    cutoff = now() - DM_DEDUPE_HOURS * 3600
+    async with DB_LOCK:
+        with db() as c:
+            done = {r["user_id"] for r in c.execute(SQL_DM_SENT, (gid, campaign_key, cutoff))}
+    return [m for m in targets if m.id not in done]
 
 
-# -------------------------
-# ROLE SYNC (DEBOUNCED)
-# -------------------------
-async def request_role_sync(guild: discord.Guild):
-    if guild.id in _role_sync_tasks:
+async def dm_record(gid: int, campaign_key: str, user_ids: list[int]) -> None:
+    if not user_ids:
         return
+    ts = now()
+    async with DB_LOCK:
+        with db() as c:
+            c.executemany(
+                "INSERT OR REPLACE INTO dm_deliveries (guild_id, campaign_key, user_id, sent_at) VALUES (?,?,?,?)",
+                [(gid, campaign_key, uid, ts) for uid in user_ids],
+            )
+            c.commit()
 
-    async def runner():
-        await asyncio.sleep(ROLE_SYNC_DEBOUNCE_SECONDS)
-        try:
-            await sync_all_roles(guild)
-        finally:
-            _role_sync_tasks.pop(guild.id, None)
 
-    _role_sync_tasks[guild.id] = asyncio.create_task(runner())
+# -------------------------
+# XP STATE STORE (per-guild columns in memory, SQLite is the durable copy)
+# -------------------------
+class GuildXpStore:
+    """Hot per-user state as parallel int64 arrays, indexed through a user_id -> slot map.
 
+    Reads never touch SQLite; every write goes through update()/fill() so the
+    `users` table stays the write-through backing store. Columns change with the
+    UPDATE; if that transaction rolls back the connection drops the whole store.
 
-async def sync_all_roles(guild: discord.Guild):
-    roles_by_name = {r.name: r for r in guild.roles}
-    managed = [roles_by_name[n] for n in ROLE_NAMES if n in roles_by_name]
+    array('q') trades speed for memory: 8 bytes per value instead of a pointer plus
+    a boxed int, but every element read in the whole-guild loops below allocates an
+    int, so they run somewhat slower than over lists. bench.py reports both.
+    """
 
-    members = await fetch_members(guild)
-    ids = list(members.keys())
+    FIELDS = ("xp", "last_active", "decay_through", "chat_cooldown", "last_minute", "earned_this_minute", "vc_seconds")
+
+    def __init__(self, gid: int):
+        self.gid = gid
+        self.slots: dict[int, int] = {}
+        self.user_ids = array("q")
+        self.cols: dict[str, array] = {f: array("q") for f in self.FIELDS}
+
+    def load(self, c: sqlite3.Connection) -> "GuildXpStore":
+        rows = c.execute(SQL_USERS_LOAD.format(cols=", ".join(self.FIELDS)), (self.gid,))
+        for r in rows:
+            self._append(int(r[0]), [int(v or 0) for v in tuple(r)[1:]])
+        return self
+
+    def _append(self, uid: int, values) -> int:
+        slot = len(self.user_ids)
+        self.slots[uid] = slot
+        self.user_ids.append(uid)
+        for f, v in zip(self.FIELDS, values):
+            self.cols[f].append(v)
+        return slot
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def ensure(self, c: sqlite3.Connection, uids) -> None:
+        new = [uid for uid in dict.fromkeys(uids) if uid not in self.slots]
+        if not new:
+            return
+        c.executemany(
+            "INSERT INTO users (guild_id, user_id) VALUES (?, ?) "
+            "ON CONFLICT(guild_id, user_id) DO NOTHING",
+            [(self.gid, uid) for uid in new],
+        )
+        c.commit()  # the slot must never outlive a rolled-back row
+        zeros = [0] * len(self.FIELDS)
+        for uid in new:
+            self._append(uid, zeros)
+
+    def get(self, c: sqlite3.Connection, uid: int) -> dict[str, int]:
+        slot = self.slots.get(uid)
+        if slot is None:
+            self.ensure(c, [uid])
+            slot = self.slots[uid]
+        out = {f: self.cols[f][slot] for f in self.FIELDS}
+        out["user_id"] = uid
+        return out
+
+    def update(self, c: sqlite3.Connection, uid: int, **values: int) -> None:
+        c.execute(
+            SQL_USERS_UPDATE.format(sets=", ".join(f"{k}=?" for k in values)),
+            (*values.values(), self.gid, uid),
+        )
+        c.dirty_stores.add(self.gid)
+        slot = self.slots[uid]
+        for k, v in values.items():
+            self.cols[k][slot] = int(v)
+
+    def fill(self, c: sqlite3.Connection, **values: int) -> None:
+        c.execute(SQL_USERS_FILL.format(sets=", ".join(f"{k}=?" for k in values)), (*values.values(), self.gid))
+        c.dirty_stores.add(self.gid)
+        n = len(self.user_ids)
+        for k, v in values.items():
+            self.cols[k] = array("q", [int(v)]) * n
+
+    # ---- whole-guild operations over the columns ----
+    def xp_of(self, uid: int, ts: int) -> int:
+        slot = self.slots.get(uid)
+        if slot is None:
+            return 0
+        return effective_xp(self.cols["xp"][slot], self.cols["last_active"][slot], self.cols["decay_through"][slot], ts)
+
+    def xp_map(self, uids, ts: int) -> dict[int, int]:
+        eff, slots = self.effective_all(ts), self.slots
+        return {uid: (eff[slots[uid]] if uid in slots else 0) for uid in uids}
+
+    def effective_all(self, ts: int) -> array:
+        out = array("q", self.cols["xp"])
+        last_active, decay_through = self.cols["last_active"], self.cols["decay_through"]
+        idle_before = ts - DECAY_GRACE_HOURS * 3600
+        for i, la in enumerate(last_active):
+            if la < idle_before and out[i] > 0:  # cheap filter: only idle users can owe decay
+                out[i] = effective_xp(out[i], la, decay_through[i], ts)
+        return out
+
+    def standings(self, ts: int) -> list[tuple[int, int]]:
+        out = list(zip(self.user_ids, self.effective_all(ts)))
+        out.sort(key=lambda x: (-x[1], x[0]))
+        return out
+
+    def top_k(self, k: int, ts: int, xp_by_uid: dict[int, int] | None = None, min_xp: int = 0) -> list[tuple[int, int]]:
+        """Best k (user_id, xp) by (xp desc, user_id asc); whole guild, or just the users in `xp_by_uid`."""
+        if xp_by_uid is None:
+            pairs = zip(self.user_ids, self.effective_all(ts))
+        else:
+            pairs = xp_by_uid.items()
+        best = heapq.nsmallest(k, ((-x, uid) for uid, x in pairs if x >= min_xp))
+        return [(uid, -negx) for negx, uid in best]
 
-    async with DB_LOCK:
-        with db() as c:
-            ensure_users_exist(c, guild.id, ids)
-            c.commit()
+    def any_idle(self, cutoff: int) -> bool:
+        xp = self.cols["xp"]
+        return any(la < cutoff and xp[i] > 0 for i, la in enumerate(self.cols["last_active"]))
 
-    rank_map = compute_rank_map(guild.id, ids)
+    def memory_bytes(self) -> int:
+        n = sys.getsizeof(self.slots) + sys.getsizeof(self.user_ids)
+        n += sum(sys.getsizeof(a) for a in self.cols.values())
+        # the dict holds boxed ints; small slot ints are shared, user ids are not
+        n += sum(sys.getsizeof(uid) for uid in self.slots)
+        return n
 
-    ok = failed = 0
-    edits = 0
 
-    for uid, m in members.items():
-        target_name = rank_map.get(uid, ROLE_INITIATE)
-        target_role = roles_by_name.get(target_name)
-        if not target_role:
-            failed += 1
-            continue
+_xp_stores: dict[int, GuildXpStore] = {}
+
+
+def xp_store(c: sqlite3.Connection, gid: int) -> GuildXpStore:
+    store = _xp_stores.get(gid)
+    if store is None:
+        store = _xp_stores[gid] = GuildXpStore(gid).load(c)
+    return store
+
+
+# -------------------------
+# SCHEDULING HELPERS
+# -------------------------
+class DeadlineQueue:
+    """Min-heap of (due_at, key). wait_due() sleeps until the earliest deadline, no polling."""
+
+    def __init__(self):
+        self._heap: list[tuple[int, str]] = []
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, due_at: int, key: str) -> None:
+        due_at = int(due_at)
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due_at, key))
+        # only wake the consumer if its current sleep target moved earlier
+        if earliest is None or due_at < earliest:
+            self._wakeup.set()
+
+    def replace(self, items: list[tuple[int, str]]) -> None:
+        self._heap = [(int(due_at), key) for due_at, key in items]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    async def wait_due(self) -> list[str]:
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            cutoff = now()
+            due: list[str] = []
+            while self._heap and self._heap[0][0] <= cutoff:
+                due.append(heapq.heappop(self._heap)[1])
+            return due
+
+
+class TokenBucket:
+    """Refills `per_minute` tokens a minute, holds at most `burst`; acquire() waits for one."""
+
+    def __init__(self, per_minute: float, burst: int = 1):
+        self.rate = max(0.001, float(per_minute)) / 60.0
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        t = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (t - self.updated) * self.rate)
+        self.updated = t
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while True:
+            delay = self.wait_time()
+            if delay <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(delay)
+
+
+class RestGovernor:
+    """Single gate for outbound REST calls.
+
+    Callers await acquire(*bucket_keys, priority=...) right before each request. A waiter is
+    granted once the global bucket and all of its own buckets have a token; among ready
+    waiters, INTERACTIVE ones always go before BULK ones. Bucket keys look like "dm" or
+    "roles:<guild_id>"; the part before ":" picks the rate from define().
+    """
+
+    INTERACTIVE = 0
+    BULK = 1
+
+    def __init__(self, global_per_second: float):
+        self.global_bucket = TokenBucket(global_per_second * 60, burst=max(1, int(global_per_second)))
+        self._limits: dict[str, tuple[float, int]] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, tuple[str, ...], asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.granted = [0, 0]
+        self.wait_total = [0.0, 0.0]
+        self.wait_max = [0.0, 0.0]
+        self.rate_limited = 0  # 429 responses, counted by the aiohttp trace
+
+    def define(self, prefix: str, per_minute: float, burst: int = 1) -> None:
+        self._limits[prefix] = (per_minute, burst)
+
+    def _bucket(self, key: str) -> TokenBucket:
+        b = self._buckets.get(key)
+        if b is None:
+            per_minute, burst = self._limits[key.split(":", 1)[0]]
+            b = self._buckets[key] = TokenBucket(per_minute, burst)
+        return b
+
+    async def acquire(self, *keys: str, priority: int = BULK) -> None:
+        for k in keys:
+            self._bucket(k)  # unknown prefixes fail here, not inside the dispatcher
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), keys, fut))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        started = time.monotonic()
+        await fut
+        waited = time.monotonic() - started
+        self.granted[priority] += 1
+        self.wait_total[priority] += waited
+        self.wait_max[priority] = max(self.wait_max[priority], waited)
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wakeup.clear()
+            self._waiters = [w for w in self._waiters if not w[3].done()]  # drop cancelled callers
+            heapq.heapify(self._waiters)
+            if not self._waiters:
+                await self._wakeup.wait()
+                continue
+
+            delay = self.global_bucket.wait_time()
+            if delay <= 0:
+                delay = 1.0
+                for w in sorted(self._waiters):
+                    buckets = [self._bucket(k) for k in w[2]]
+                    wait = max((b.wait_time() for b in buckets), default=0.0)
+                    if wait <= 0:
+                        for b in buckets:
+                            b.tokens -= 1
+                        self.global_bucket.tokens -= 1
+                        self._waiters.remove(w)
+                        w[3].set_result(None)
+                        delay = 0
+                        break
+                    delay = min(delay, wait)
+                if delay == 0:
+                    await asyncio.sleep(0)  # let the granted caller run before the next grant
+                    continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def queue_depth(self) -> tuple[int, int]:
+        pending = [w for w in self._waiters if not w[3].done()]
+        interactive = sum(1 for w in pending if w[0] == self.INTERACTIVE)
+        return interactive, len(pending) - interactive
+
+    def stats(self) -> str:
+        parts = []
+        for prio, name in ((self.INTERACTIVE, "interactive"), (self.BULK, "bulk")):
+            n = self.granted[prio]
+            avg = self.wait_total[prio] / n if n else 0.0
+            parts.append(f"{name} {n} (avg wait {avg:.2f}s, max {self.wait_max[prio]:.2f}s)")
+        interactive, bulk = self.queue_depth()
+        return f"queued {interactive}+{bulk}, " + ", ".join(parts) + f", 429s {self.rate_limited}"
+
+
+async def _count_429(session, ctx, params: aiohttp.TraceRequestEndParams) -> None:
+    # every response discord.py receives passes here, including the 429s it then sleeps and retries
+    if params.response.status == 429:
+        rest.rate_limited += 1
+
+
+_http_trace.on_request_end.append(_count_429)
+
+# per-guild and per-channel buckets need no split: each guild lives on exactly one shard
+rest = RestGovernor(process_share(REST_GLOBAL_PER_SECOND))
+rest.define("roles", REST_ROLE_EDITS_PER_MINUTE, burst=8)
+rest.define("dm", process_share(REST_DMS_PER_MINUTE), burst=5)
+rest.define("messages", REST_CHANNEL_MESSAGES_PER_MINUTE, burst=5)
+rest.define("history", process_share(REST_HISTORY_PAGES_PER_MINUTE), burst=5)
+rest.define("countdown", process_share(POLL_COUNTDOWN_EDITS_PER_MINUTE), burst=5)
+Counter("phoenixp_rest_queue_depth", "Callers waiting on the REST governor", kind="gauge", read=lambda: sum(rest.queue_depth()))
+Counter("phoenixp_rest_429_total", "429 responses received from Discord", read=lambda: rest.rate_limited)
+
+
+# -------------------------
+# XP CORE
+# -------------------------
+def day_of(ts: int) -> int:
+    return ts // 86400
+
+
+class ActivityRollups:
+    """Per-(guild, day, user) counters, summed in memory and upserted in batches."""
+
+    def __init__(self):
+        self.pending: dict[tuple[int, int, int], list[int]] = {}  # -> [chat, vc_s, gained, decayed]
+
+    def add(self, gid: int, uid: int, ts: int, chat_ticks: int = 0, vc_seconds: int = 0,
+            xp_gained: int = 0, xp_decayed: int = 0) -> None:
+        acc = self.pending.setdefault((gid, day_of(ts), uid), [0, 0, 0, 0])
+        acc[0] += chat_ticks
+        acc[1] += vc_seconds
+        acc[2] += xp_gained
+        acc[3] += xp_decayed
+
+    def add_vc(self, gid: int, uid: int, start: int, end: int) -> None:
+        # split at UTC midnight so a late-night session lands on both days
+        while start < end:
+            cut = min(end, (day_of(start) + 1) * 86400)
+            self.add(gid, uid, start, vc_seconds=cut - start)
+            start = cut
+
+    def add_decay(self, gid: int, uid: int, u: dict[str, int], ts: int) -> None:
+        # attribute each lazily applied step to the day it was due, not the day it was written
+        last_active = int(u["last_active"])
+        done = decay_steps_due(last_active, max(int(u["decay_through"] or 0), last_active))
+        xp = int(u["xp"])
+        for step in range(done + 1, decay_steps_due(last_active, ts) + 1):
+            nxt = _decay_step(xp)
+            if nxt == xp:
+                break
+            step_ts = last_active + DECAY_GRACE_HOURS * 3600 + (step - 1) * 86400 + 1
+            self.add(gid, uid, step_ts, xp_decayed=xp - nxt)
+            xp = nxt
+
+    def flush(self, c: sqlite3.Connection) -> int:
+        pending, self.pending = self.pending, {}
+        if pending:
+            c.executemany("""
+                INSERT INTO activity_daily (guild_id, day, user_id, chat_ticks, vc_seconds, xp_gained, xp_decayed)
+                VALUES (?,?,?,?,?,?,?)
+                ON CONFLICT(guild_id, day, user_id) DO UPDATE SET
+                    chat_ticks=chat_ticks+excluded.chat_ticks,
+                    vc_seconds=vc_seconds+excluded.vc_seconds,
+                    xp_gained=xp_gained+excluded.xp_gained,
+                    xp_decayed=xp_decayed+excluded.xp_decayed
+            """, [(*k, *v) for k, v in pending.items()])
+        return len(pending)
+
+
+_activity = ActivityRollups()
+
+
+class XpLedger:
+    """Writer for xp_events; users.xp stays the O(1) current-value snapshot.
+
+    Events go in on the caller's connection, so they commit or roll back with the users
+    write they describe: the balance always equals the sum of its deltas.
+    """
+
+    def record(self, c: sqlite3.Connection, gid: int, uid: int, u: dict[str, int], effective: int, new: int,
+               reason: str, ts: int) -> None:
+        # stored -> effective is lazily applied decay, effective -> new is the change itself
+        stored = int(u["xp"])
+        rows = []
+        if effective != stored:
+            rows.append((gid, uid, ts, effective - stored, effective, "decay"))
+            _activity.add_decay(gid, uid, u, ts)
+        if new != effective:
+            rows.append((gid, uid, ts, new - effective, new, reason))
+            if reason in ("chat", "vc"):
+                _activity.add(gid, uid, ts, xp_gained=new - effective)
+        if rows:
+            c.executemany(
+                "INSERT INTO xp_events (guild_id, user_id, ts, delta, xp_after, reason) VALUES (?,?,?,?,?,?)",
+                rows,
+            )
+
+
+_xp_ledger = XpLedger()
+
+
+def xp_at(c: sqlite3.Connection, gid: int, uid: int, ts: int) -> int:
+    """XP as of `ts` (as recorded; lazy decay lands when the user is next touched)."""
+    r = c.execute(SQL_XP_AT, (gid, uid, ts)).fetchone()
+    return int(r["xp_after"]) if r else 0
+
+
+def compact_xp_ledger(c: sqlite3.Connection, horizon: int) -> int:
+    """Fold everything older than `horizon` into one snapshot row per user."""
+    cur = c.execute(SQL_LEDGER_COMPACT, (horizon, horizon))
+    c.execute(SQL_LEDGER_SNAPSHOT, (horizon,))
+    return cur.rowcount
+
+
+def award_xp(c: sqlite3.Connection, gid: int, uid: int, amount: int, ts: int, reason: str = "chat",
+             recorded_at: int | None = None) -> int:
+    """`ts` is when the activity happened; `recorded_at` (default `ts`) is the ledger time of the credit."""
+    u = get_user(c, gid, uid)
+    bucket = minute_bucket(ts)
+
+    earned = int(u["earned_this_minute"])
+    if bucket != int(u["last_minute"]):
+        earned = 0
+
+    award = max(0, min(int(amount), PER_MINUTE_XP_CAP - earned))
+    if not award:
+        return 0
+
+    # pending decay is written back now that the user is active again
+    effective = row_xp(u, ts)
+    new_xp = clamp_xp(effective + award)
+    xp_store(c, gid).update(
+        c, uid, xp=new_xp, last_active=ts, decay_through=ts, last_minute=bucket, earned_this_minute=earned + award
+    )
+    _xp_ledger.record(c, gid, uid, u, effective, new_xp, reason, ts if recorded_at is None else recorded_at)
+    if reason == "chat":
+        _activity.add(gid, uid, ts, chat_ticks=1)
+    return award
+
+
+# -------------------------
+# DECAY (lazy: derived from last_active on read, written back on next touch)
+# -------------------------
+def _decay_step(xp: int) -> int:
+    if xp <= 0:
+        return xp
+    loss = max(int(xp * DECAY_PERCENT_PER_DAY), DECAY_MIN_XP_PER_DAY)
+    new_xp = clamp_xp(xp - loss)
+    if xp >= DECAY_FLOOR_XP:
+        new_xp = max(DECAY_FLOOR_XP, new_xp)
+    return new_xp
+
+
+def decay_steps_due(last_active: int, ts: int) -> int:
+    """Daily decay steps owed by `ts`: the first one just past the grace window, then one per 24h."""
+    idle = ts - last_active - DECAY_GRACE_HOURS * 3600
+    if idle <= 0:
+        return 0
+    return (idle - 1) // 86400 + 1
+
+
+@functools.lru_cache(maxsize=65536)  # pure in (xp, steps); idle guilds repeat the same pairs a lot
+def apply_decay(xp: int, steps: int) -> int:
+    for _ in range(steps):
+        nxt = _decay_step(xp)
+        if nxt == xp:
+            break  # at the floor (or 0), further steps are no-ops
+        xp = nxt
+    return xp
+
+
+def effective_xp(xp: int, last_active: int, decay_through: int, ts: int) -> int:
+    pending = decay_steps_due(last_active, ts) - decay_steps_due(last_active, max(decay_through, last_active))
+    return apply_decay(int(xp), pending) if pending > 0 else int(xp)
+
+
+def row_xp(r: dict[str, int], ts: int) -> int:
+    return effective_xp(int(r["xp"]), int(r["last_active"]), int(r["decay_through"] or 0), ts)
+
+
+def guild_xp_standings(c: sqlite3.Connection, gid: int, ts: int) -> list[tuple[int, int]]:
+    """(user_id, effective xp) for the guild, best first."""
+    return xp_store(c, gid).standings(ts)
+
+
+# -------------------------
+# RANKING (TOP-X)
+# -------------------------
+def compute_rank_map(gid: int, member_ids: list[int]) -> dict[int, str]:
+    if not member_ids:
+        return {}
+
+    with db() as c:
+        store = xp_store(c, gid)
+
+    ts = now()
+    xp_map = store.xp_map(member_ids, ts)
+
+    eligible = store.top_k(TOP_ASCENDANT + NEXT_EMBER, ts, xp_map, min_xp=INITIATE_EXIT_XP)
+
+    topA = {uid for uid, _ in eligible[:TOP_ASCENDANT]}
+    nextE = {uid for uid, _ in eligible[TOP_ASCENDANT:TOP_ASCENDANT + NEXT_EMBER]}
+
+    out: dict[int, str] = {}
+    for uid in member_ids:
+        x = xp_map.get(uid, 0)
+        if x < INITIATE_EXIT_XP:
+            out[uid] = ROLE_INITIATE
+        elif uid in topA:
+            out[uid] = ROLE_ASCENDANT
+        elif uid in nextE:
+            out[uid] = ROLE_EMBER
+        else:
+            out[uid] = ROLE_OPERATIVE
+    return out
 
-        current_managed = [r for r in managed if r in m.roles]
-        if len(current_managed) == 1 and current_managed[0].id == target_role.id:
-            continue
 
-        to_remove = [r for r in current_managed if r.id != target_role.id]
+def display_rank(m: discord.Member, computed: str) -> str:
+    return f"Prime + {computed}" if has_prime(m) else computed
+
+
+# -------------------------
+# ROLE SYNC (DEBOUNCED)
+# -------------------------
+async def request_role_sync(guild: discord.Guild):
+    if guild.id in _role_sync_tasks:
+        return
 
+    async def runner():
+        await asyncio.sleep(ROLE_SYNC_DEBOUNCE_SECONDS)
         try:
-            if to_remove:
-                await m.remove_roles(*to_remove, reason="Rank sync")
-            if target_role not in m.roles:
-                await m.add_roles(target_role, reason="Rank sync")
-            ok += 1
-            edits += 1
-        except Exception:
-            failed += 1
+            await sync_all_roles(guild)
+        finally:
+            _role_sync_tasks.pop(guild.id, None)
+
+    _role_sync_tasks[guild.id] = asyncio.create_task(runner())
+
+
+@timed(ROLE_SYNC_SECONDS)
+async def sync_all_roles(guild: discord.Guild):
+    roles_by_name = {r.name: r for r in guild.roles}
+    managed = [roles_by_name[n] for n in ROLE_NAMES if n in roles_by_name]
+
+    with span("fetch_members"):
+        members = await fetch_members(guild)
+    ids = list(members.keys())
+
+    with span("db_write"):
+        async with DB_LOCK:
+            with db() as c:
+                ensure_users_exist(c, guild.id, ids)
+                c.commit()
+
+    with span("compute_rank_map"):
+        rank_map = compute_rank_map(guild.id, ids)
+
+    ok = failed = 0
+    bucket = f"roles:{guild.id}"
+    with span("role_edits"):
+        for uid, m in members.items():
+            target_name = rank_map.get(uid, ROLE_INITIATE)
+            target_role = roles_by_name.get(target_name)
+            if not target_role:
+                failed += 1
+                continue
+
+            current_managed = [r for r in managed if r in m.roles]
+            if len(current_managed) == 1 and current_managed[0].id == target_role.id:
+                continue
+
+            to_remove = [r for r in current_managed if r.id != target_role.id]
 
-        if edits and edits % ROLE_SYNC_SLEEP_EVERY_EDITS == 0:
-            await asyncio.sleep(ROLE_SYNC_SLEEP_SECONDS)
+            try:
+                if to_remove:
+                    await rest.acquire(bucket)
+                    await m.remove_roles(*to_remove, reason="Rank sync")
+                if target_role not in m.roles:
+                    await rest.acquire(bucket)
+                    await m.add_roles(target_role, reason="Rank sync")
+                ok += 1
+            except Exception:
+                failed += 1
 
+    ROLE_SYNC_EDITS.inc(ok, result="ok")
+    ROLE_SYNC_EDITS.inc(failed, result="failed")
     return ok, failed
 
 
@@ -543,6 +1983,16 @@ class EveryoneConfirmModal(discord.ui.Modal, title="Confirm DM @everyone"):
         await interaction.response.defer(ephemeral=True)
 
 
+def _notify_render_body(title: str, body: str, note: str | None) -> str:
+    def build() -> str:
+        msg = f"# {auto_bold_phrases(title)}\n{auto_bold_phrases(body)}"
+        if note:
+            msg += f"\n-# {auto_bold_phrases(note)}"
+        return msg
+
+    return _render_cache.get(("notify", title, body, note or ""), build)
+
+
 class NotifyView(discord.ui.View):
     def __init__(self, author_id: int, channel: discord.abc.Messageable, title: str, body: str, note: str = ""):
         super().__init__(timeout=900)
@@ -676,14 +2126,7 @@ class NotifyView(discord.ui.View):
 
     def render_public(self) -> str:
         ping = self._ping_text()
-        title = auto_bold_phrases(self.title)
-        body = auto_bold_phrases(self.body)
-        note = auto_bold_phrases(self.note) if self.note else ""
-
-        msg = f"{(ping + chr(10)) if ping else ''}# {title}\n{body}"
-        if note:
-            msg += f"\n-# {note}"
-        return msg
+        return f"{(ping + chr(10)) if ping else ''}{_notify_render_body(self.title, self.body, self.note)}"
 
     def render_preview(self) -> str:
         msg = self.render_public()
@@ -800,14 +2243,13 @@ class NotifyView(discord.ui.View):
         await self._rerender(interaction)
 
     async def _dm_targets(self, guild: discord.Guild) -> list[discord.Member]:
-        members = await fetch_members(guild)
-        ms = list(members.values())
+        return await resolve_dm_audience(guild, self.ping_mode, self.role)
 
-        if self.ping_mode == "everyone":
-            return [m for m in ms if not m.bot]
-        if self.ping_mode == "role" and self.role:
-            return [m for m in ms if (not m.bot and self.role in m.roles)]
-        return []
+    def _campaign_key(self, content: str) -> str:
+        h = hashlib.sha1(content.encode())
+        for data, _ in self.images[:NOTIFY_MAX_IMAGES]:
+            h.update(hashlib.sha1(data).digest())
+        return f"notify:{h.hexdigest()}"
 
     def _build_embeds_and_files(self) -> tuple[list[discord.Embed], list[discord.File]]:
         if not self.images:
@@ -825,11 +2267,15 @@ class NotifyView(discord.ui.View):
 
         return embeds, files
 
-    async def _send_dms(self, guild: discord.Guild, content: str, embeds: list[discord.Embed]) -> tuple[int, int]:
+    async def _send_dms(self, guild: discord.Guild, content: str, embeds: list[discord.Embed]) -> tuple[int, int, int]:
         sent = failed = 0
-        targets = await self._dm_targets(guild)
+        key = self._campaign_key(content)
+        audience = await self._dm_targets(guild)
+        targets = await dm_pending(guild.id, key, audience)
+        delivered: list[int] = []
 
         for m in targets:
+            await rest.acquire("dm")
             try:
                 files: list[discord.File] = []
                 if self.images:
@@ -844,12 +2290,18 @@ class NotifyView(discord.ui.View):
                     await m.send(content)
 
                 sent += 1
+                delivered.append(m.id)
+                DMS_TOTAL.inc(kind="notify", result="sent")
             except Exception:
                 failed += 1
+                DMS_TOTAL.inc(kind="notify", result="failed")
 
-            await asyncio.sleep(0.6)
+            if len(delivered) >= 25:
+                await dm_record(guild.id, key, delivered)
+                delivered = []
 
-        return sent, failed
+        await dm_record(guild.id, key, delivered)
+        return sent, failed, len(audience) - len(targets)
 
     async def _wait_for_image_message(self, channel: discord.abc.Messageable, author_id: int) -> discord.Message | None:
         def check(m: discord.Message) -> bool:
@@ -875,7 +2327,7 @@ class NotifyView(discord.ui.View):
         if len(self.images) >= NOTIFY_MAX_IMAGES:
             return False, f"Already at max images ({NOTIFY_MAX_IMAGES})."
 
-        added = 0
+        added = saved = 0
         names_used = {fn for _, fn in self.images}
 
         for a in imgs:
@@ -893,19 +2345,26 @@ class NotifyView(discord.ui.View):
             if len(data) > NOTIFY_MAX_IMAGE_BYTES:
                 continue
 
-            desired = _safe_filename(a.filename or "image.png")
-            filename = _dedupe_filename(names_used, desired)
+            kind = image_kind(data)
+            if kind is None:
+                continue
+            processed = await preprocess_image(data, kind)
+            saved += len(data) - len(processed)
+
+            base = _safe_filename(a.filename or "image.png").rpartition(".")[0] or "image"
+            filename = _dedupe_filename(names_used, f"{base}.{_IMAGE_EXT[kind]}")
 
-            self.images.append((data, filename))
+            self.images.append((processed, filename))
             added += 1
 
         if added == 0:
             return False, "No valid images added (type/size?)."
 
+        note = f" Saved {saved // 1024} KB." if saved >= 1024 else ""
         if len(imgs) > added:
-            return True, f"Added {added} image(s). Some were skipped (limit/size)."
+            return True, f"Added {added} image(s). Some were skipped (limit/size/type).{note}"
 
-        return True, f"Added {added} image(s)."
+        return True, f"Added {added} image(s).{note}"
 
     @discord.ui.button(label="Edit", style=discord.ButtonStyle.blurple, row=3)
     async def edit(self, interaction: discord.Interaction, _):
@@ -1025,6 +2484,7 @@ class NotifyView(discord.ui.View):
             return
 
         try:
+            await rest.acquire(f"messages:{self.channel.id}", priority=rest.INTERACTIVE)
             if files and embeds:
                 await self.channel.send(
                     content,
@@ -1046,9 +2506,9 @@ class NotifyView(discord.ui.View):
                 pass
 
             if self.dm_enabled:
-                sent, failed = await self._send_dms(interaction.guild, content, embeds)
+                sent, failed, skipped = await self._send_dms(interaction.guild, content, embeds)
                 try:
-                    await interaction.followup.send(f"DMs: {sent} sent, {failed} failed", ephemeral=True)
+                    await interaction.followup.send(_dm_summary(sent, failed, skipped), ephemeral=True)
                 except Exception:
                     pass
 
@@ -1146,50 +2606,86 @@ def _poll_ping_text(mode: str, role: discord.Role | None) -> str:
     return ""
 
 
+def _poll_ping_text_stored(mode: str, role_id: int | None) -> str:
+    # same as _poll_ping_text, from the columns saved in `polls`
+    if mode == "role" and role_id:
+        return f"<@&{int(role_id)}>"
+    return _poll_ping_text(mode, None)
+
+
 def _poll_make_id() -> str:
     # short, url-safe-ish
     return secrets.token_urlsafe(9)
 
 
-def _poll_time_left_text(ends_at: int) -> str:
-    remaining = max(0, ends_at - now())
+def _poll_countdown_unit(remaining: int) -> tuple[int, str]:
+    # days while >= 2d left, then hours while >= 2h, then minutes
+    for size, suffix in ((86400, "d"), (3600, "h")):
+        if remaining >= 2 * size:
+            return size, suffix
+    return 60, "m"
+
+
+def _poll_time_left_text(ends_at: int, ts: int | None = None) -> str:
+    remaining = max(0, ends_at - (now() if ts is None else ts))
     if remaining <= 0:
         return "Ended"
-    mins = remaining // 60
-    hrs = mins // 60
-    days = hrs // 24
-    if days > 0:
-        return f"{days}d {hrs % 24}h"
-    if hrs > 0:
-        return f"{hrs}h {mins % 60}m"
-    return f"{mins}m"
+    size, suffix = _poll_countdown_unit(remaining)
+    return f"{remaining // size}{suffix}"
+
+
+def _poll_countdown_next_change(ends_at: int, ts: int) -> int | None:
+    """First second at which _poll_time_left_text() shows something new (None: only the close is left)."""
+    remaining = ends_at - ts
+    if remaining <= 0:
+        return None
+    size, _ = _poll_countdown_unit(remaining)
+    shown = remaining // size
+    if shown <= 0:
+        return None
+    return ends_at - shown * size + 1
+
+
+def _poll_render_bolded(question: str, options: list[str]) -> tuple[str, list[str]]:
+    q = _render_cache.get(("bold", question), lambda: auto_bold_phrases(question))
+    return q, [_render_cache.get(("bold", opt), lambda opt=opt: auto_bold_phrases(opt)) for opt in options]
 
 
 def _poll_render_active(question: str, options: list[str], ends_at: int) -> str:
-    q = auto_bold_phrases(question)
+    def build_options() -> str:
+        _, opts = _poll_render_bolded(question, options)
+        return "\n".join(f"{i}. {opt}" for i, opt in enumerate(opts, start=1))
+
+    q, _ = _poll_render_bolded(question, [])
     lines = [f"🗳️ **POLL**", f"**{q}**", "", "*(Anonymous voting — results hidden until the poll ends. No vote changes.)*"]
     lines.append(f"⏳ Poll lasts: **{_poll_time_left_text(ends_at)}**")
     lines.append("")
-    for i, opt in enumerate(options, start=1):
-        lines.append(f"{i}. {auto_bold_phrases(opt)}")
+    lines.append(_render_cache.get(("poll_options", tuple(options)), build_options))
     return "\n".join(lines)
 
 
 def _poll_render_closed(question: str, options: list[str], counts: list[int], ends_at: int) -> str:
+    # a poll closes once: its text is never rendered again, so build uncached and drop what the open poll cached
+    text = _poll_build_closed(question, options, counts, ends_at)
+    _render_cache.discard(("poll_options", tuple(options)), ("bold", question), *(("bold", opt) for opt in options))
+    return text
+
+
+def _poll_build_closed(question: str, options: list[str], counts: list[int], ends_at: int) -> str:
+    q, options = _poll_render_bolded(question, options)
     total = sum(counts)
-    q = auto_bold_phrases(question)
     lines = [f"🗳️ **POLL — CLOSED**", f"**{q}**", f"🕒 Ended: <t:{ends_at}:f>", ""]
     if total <= 0:
         lines.append("No votes were cast.")
         lines.append("")
         for i, opt in enumerate(options, start=1):
-            lines.append(f"{i}. {auto_bold_phrases(opt)} — **0** (0%)")
+            lines.append(f"{i}. {opt} — **0** (0%)")
         return "\n".join(lines)
 
     for i, opt in enumerate(options, start=1):
         c = counts[i - 1] if i - 1 < len(counts) else 0
         pct = (c / total) * 100.0
-        lines.append(f"{i}. {auto_bold_phrases(opt)} — **{c}** ({pct:.1f}%)")
+        lines.append(f"{i}. {opt} — **{c}** ({pct:.1f}%)")
     lines.append("")
     lines.append(f"Total votes: **{total}**")
     return "\n".join(lines)
@@ -1263,7 +2759,7 @@ class PollVoteButton(discord.ui.Button):
         # load poll
         async with DB_LOCK:
             with db() as c:
-                poll = c.execute("SELECT * FROM polls WHERE poll_id=?", (self.poll_id,)).fetchone()
+                poll = c.execute(SQL_POLL_GET, (self.poll_id,)).fetchone()
                 if not poll:
                     return await interaction.response.send_message("Poll not found.", ephemeral=True)
 
@@ -1272,10 +2768,8 @@ class PollVoteButton(discord.ui.Button):
 
                 # enforce "no swaps" by PK (poll_id, user_id)
                 try:
-                    c.execute(
-                        "INSERT INTO poll_votes (poll_id, user_id, option_index, voted_at) VALUES (?,?,?,?)",
-                        (self.poll_id, interaction.user.id, int(self.option_index), now()),
-                    )
+                    c.execute(SQL_POLL_VOTE, (self.poll_id, interaction.user.id, int(self.option_index), now()))
+                    c.execute(SQL_POLL_TALLY_BUMP, (self.poll_id, int(self.option_index)))
                     c.commit()
                 except sqlite3.IntegrityError:
                     return await interaction.response.send_message(
@@ -1477,25 +2971,29 @@ class PollSetupView(discord.ui.View):
         await self._rerender(interaction)
 
     async def _poll_dm_targets(self, guild: discord.Guild) -> list[discord.Member]:
-        members = await fetch_members(guild)
-        ms = list(members.values())
-        if self.ping_mode == "everyone":
-            return [m for m in ms if not m.bot]
-        if self.ping_mode == "role" and self.role:
-            return [m for m in ms if (not m.bot and self.role in m.roles)]
-        return []
+        return await resolve_dm_audience(guild, self.ping_mode, self.role)
 
-    async def _poll_send_dms(self, guild: discord.Guild, content: str) -> tuple[int, int]:
+    async def _poll_send_dms(self, guild: discord.Guild, poll_id: str, content: str) -> tuple[int, int, int]:
         sent = failed = 0
-        targets = await self._poll_dm_targets(guild)
+        key = f"poll:{poll_id}"
+        audience = await self._poll_dm_targets(guild)
+        targets = await dm_pending(guild.id, key, audience)
+        delivered: list[int] = []
         for m in targets:
+            await rest.acquire("dm")
             try:
                 await m.send(content)
                 sent += 1
+                delivered.append(m.id)
+                DMS_TOTAL.inc(kind="poll", result="sent")
             except Exception:
                 failed += 1
-            await asyncio.sleep(0.6)
-        return sent, failed
+                DMS_TOTAL.inc(kind="poll", result="failed")
+            if len(delivered) >= 25:
+                await dm_record(guild.id, key, delivered)
+                delivered = []
+        await dm_record(guild.id, key, delivered)
+        return sent, failed, len(audience) - len(targets)
 
     @discord.ui.button(label="Post Poll", style=discord.ButtonStyle.green, row=4)
     async def post_poll(self, interaction: discord.Interaction, _):
@@ -1552,6 +3050,7 @@ class PollSetupView(discord.ui.View):
         view = PollVoteView(poll_id=poll_id, options=self.options, ends_at=ends_at, disabled=False)
 
         try:
+            await rest.acquire(f"messages:{self.channel.id}", priority=rest.INTERACTIVE)
             msg = await self.channel.send(
                 content_top,
                 view=view,
@@ -1590,6 +3089,10 @@ class PollSetupView(discord.ui.View):
                     ),
                 )
                 c.commit()
+                row = c.execute(SQL_POLL_GET, (poll_id,)).fetchone()
+
+        schedule_poll_close(poll_id, ends_at)
+        schedule_poll_countdown(poll_id, row, content_top)
 
         # UI success
         ch = getattr(self.channel, "mention", "the selected channel")
@@ -1602,9 +3105,9 @@ class PollSetupView(discord.ui.View):
         if self.dm_enabled:
             jump = msg.jump_url
             dm_text = f"🗳️ New poll: **{self.question}**\nVote here: {jump}"
-            sent, failed = await self._poll_send_dms(interaction.guild, dm_text)
+            sent, failed, skipped = await self._poll_send_dms(interaction.guild, poll_id, dm_text)
             try:
-                await interaction.followup.send(f"DMs: {sent} sent, {failed} failed", ephemeral=True)
+                await interaction.followup.send(_dm_summary(sent, failed, skipped), ephemeral=True)
             except Exception:
                 pass
 
@@ -1669,112 +3172,395 @@ async def poll(interaction: discord.Interaction):
     )
 
 
-async def _close_poll_row(row: sqlite3.Row):
-    poll_id = str(row["poll_id"])
-    guild_id = int(row["guild_id"])
-    channel_id = int(row["channel_id"])
-    message_id = int(row["message_id"])
-    ends_at = int(row["ends_at"])
-    question = str(row["question"])
+def _poll_load_counts(c: sqlite3.Connection, poll_id: str, n_options: int) -> list[int]:
+    counts = [0 for _ in range(n_options)]
+    for tr in c.execute(SQL_POLL_TALLIES, (poll_id,)).fetchall():
+        idx = int(tr["option_index"])
+        if 0 <= idx < n_options:
+            counts[idx] = int(tr["count"])
+    return counts
+
+
+def _poll_options(row: sqlite3.Row) -> list[str]:
     try:
         options = json.loads(row["options_json"])
         if not isinstance(options, list):
             options = []
     except Exception:
         options = []
+    return options
+
+
+@bot.tree.command(name="polltally", description="Live vote counts for open polls (Prime only, private).")
+async def polltally(interaction: discord.Interaction):
+    if not interaction.guild:
+        return await interaction.response.send_message("Guild only.", ephemeral=True)
+    if not is_admin(interaction):
+        return await interaction.response.send_message("Prime only.", ephemeral=True)
 
-    # count votes
-    counts = [0 for _ in range(len(options))]
     async with DB_LOCK:
         with db() as c:
-            vote_rows = c.execute("SELECT option_index, COUNT(*) AS n FROM poll_votes WHERE poll_id=? GROUP BY option_index", (poll_id,)).fetchall()
-            for vr in vote_rows:
-                idx = int(vr["option_index"])
-                n = int(vr["n"])
-                if 0 <= idx < len(counts):
-                    counts[idx] = n
-
-            # mark closed in DB
-            c.execute("UPDATE polls SET closed=1 WHERE poll_id=?", (poll_id,))
-            c.commit()
-
+            polls = c.execute(SQL_POLLS_OPEN_GUILD, (interaction.guild.id,)).fetchall()
+            tallies = []
+            for p in polls:
+                opts = _poll_options(p)
+                tallies.append((p, opts, _poll_load_counts(c, str(p["poll_id"]), len(opts))))
+
+    if not tallies:
+        return await interaction.response.send_message("No open polls.", ephemeral=True)
+
+    blocks = []
+    for p, opts, counts in tallies:
+        lines = [f"**{p['question']}** — ends <t:{int(p['ends_at'])}:R> — {sum(counts)} vote(s)"]
+        for i, opt in enumerate(opts, start=1):
+            lines.append(f"{i}. {opt} — **{counts[i - 1]}**")
+        blocks.append("\n".join(lines))
+
+    text = "🗳️ **Live tallies (private)**\n\n" + "\n\n".join(blocks)
+    if len(text) > 1900:
+        text = text[:1900] + "\n…"
+    await interaction.response.send_message(text, ephemeral=True)
+
+
+def _poll_message_channel(guild_id: int, channel_id: int):
+    """Cached channel if we have it, else a PartialMessageable (no fetch round trip)."""
     guild = bot.get_guild(guild_id)
     if not guild:
-        return
-
-    channel = guild.get_channel(channel_id)
+        return None
+    channel = guild.get_channel_or_thread(channel_id)
     if channel is None:
-        try:
-            channel = await guild.fetch_channel(channel_id)
-        except Exception:
-            channel = None
-    if channel is None or not hasattr(channel, "fetch_message"):
-        return
+        channel = bot.get_partial_messageable(channel_id, guild_id=guild_id)
+    return channel if hasattr(channel, "get_partial_message") else None
 
-    try:
-        msg = await channel.fetch_message(message_id)  # type: ignore
-    except Exception:
+
+def _channel_edit_lock(channel_id: int) -> asyncio.Lock:
+    lock = _channel_edit_locks.get(channel_id)
+    if lock is None:
+        lock = _channel_edit_locks[channel_id] = asyncio.Lock()
+    return lock
+
+
+async def _close_poll_row(row: sqlite3.Row, counts: list[int]):
+    poll_id = str(row["poll_id"])
+    ends_at = int(row["ends_at"])
+    question = str(row["question"])
+    options = _poll_options(row)
+
+    channel = _poll_message_channel(int(row["guild_id"]), int(row["channel_id"]))
+    if channel is None:
         return
+    msg = channel.get_partial_message(int(row["message_id"]))  # type: ignore
 
     # remove ping on close (so it doesn't re-ping on edit)
     closed_text = _poll_render_closed(question, options, counts, ends_at)
     closed_view = PollVoteView(poll_id=poll_id, options=options, ends_at=ends_at, disabled=True)
 
+    bucket = f"messages:{int(row['channel_id'])}"
     try:
+        await rest.acquire(bucket)  # nobody is waiting on a close: bulk
         await msg.edit(content=closed_text, view=closed_view)
+    except discord.NotFound:
+        return
     except Exception:
         # fallback: at least disable view
         try:
+            await rest.acquire(bucket)
             await msg.edit(view=None)
         except Exception:
             pass
 
 
-@tasks.loop(seconds=POLL_CLOSE_CHECK_SECONDS)
-async def poll_close_loop():
-    cutoff = now()
-    due: list[sqlite3.Row] = []
-    async with DB_LOCK:
-        with db() as c:
-            rows = c.execute(
-                "SELECT * FROM polls WHERE closed=0 AND ends_at <= ? ORDER BY ends_at ASC LIMIT 25",
-                (cutoff,),
-            ).fetchall()
-            due = list(rows)
-
-    for r in due:
-        try:
-            await _close_poll_row(r)
-        except Exception:
-            traceback.print_exc()
-        await asyncio.sleep(0.4)
+async def _close_channel_polls(channel_id: int, items: list[tuple[sqlite3.Row, list[int]]], sem: asyncio.Semaphore):
+    # one channel = one edit rate-limit bucket, so keep its edits in order
+    async with sem, _channel_edit_lock(channel_id):
+        for row, counts in items:
+            try:
+                await _close_poll_row(row, counts)
+            except Exception:
+                traceback.print_exc()
 
 
 # -------------------------
-# EVENTS
+# POLL CLOSE SCHEDULER (min-heap of ends_at, no idle queries)
 # -------------------------
-@bot.event
-async def on_ready():
-    init_db()
-    await bot.tree.sync()
-    if not decay_loop.is_running():
-        decay_loop.start()
-    if not vc_xp_loop.is_running():
-        vc_xp_loop.start()
-    if not poll_close_loop.is_running():
-        poll_close_loop.start()
+_poll_close_queue = DeadlineQueue()
 
-    print("Ready:", bot.user)
 
+def schedule_poll_close(poll_id: str, ends_at: int) -> None:
+    _poll_close_queue.push(ends_at, poll_id)
 
-@bot.event
-async def on_message(msg: discord.Message):
-    if msg.author.bot or not msg.guild:
-        return
-    await bot.process_commands(msg)
 
-    if len((msg.content or "").strip()) < MIN_MESSAGE_CHARS:
-        return
+def load_poll_schedule() -> int:
+    """Load every open poll into the close and countdown queues (overdue ones close on the next tick)."""
+    with db() as c:
+        rows = c.execute(SQL_POLLS_OPEN).fetchall()
+    rows = [r for r in rows if owns_guild(int(r["guild_id"]))]  # other shards' processes close theirs
+
+    _poll_close_queue.replace([(int(r["ends_at"]), str(r["poll_id"])) for r in rows])
+
+    _poll_countdowns.clear()
+    ts = now()
+    due = []
+    for r in rows:
+        # message text from before the restart is unknown -> render once, then only on change
+        _poll_countdowns[str(r["poll_id"])] = PollCountdown(r, rendered=None)
+        due.append((ts, str(r["poll_id"])))
+    _poll_countdown_queue.replace(due)
+    return len(rows)
+
+
+@tasks.loop()
+async def poll_close_loop():
+    due_ids = await _poll_close_queue.wait_due()
+    try:
+        await close_due_polls(due_ids)
+    except Exception:
+        # the deadlines are already off the heap: put them back or these polls stay open until a restart.
+        # Polls the failed tick did claim are skipped on retry (closed=1).
+        traceback.print_exc()
+        retry_at = now() + POLL_CLOSE_RETRY_SECONDS
+        for pid in due_ids:
+            _poll_close_queue.push(retry_at, pid)
+
+
+@traced_loop("poll_close")
+@timed(LOOP_TICK_SECONDS, loop="poll_close")
+async def close_due_polls(due_ids: list[str]):
+    by_channel: dict[int, list[tuple[sqlite3.Row, list[int]]]] = {}
+    async with DB_LOCK:
+        with db() as c, span("db_claim"):
+            placeholders = ",".join("?" for _ in due_ids)
+            rows = c.execute(SQL_POLLS_DUE.format(placeholders=placeholders), due_ids).fetchall()
+            rows.sort(key=lambda r: int(r["ends_at"]))
+            for r in rows:
+                # claim before closing: a second process on the same shard (mid-deploy) may race us
+                if not c.execute(SQL_POLL_CLAIM_CLOSE, (str(r["poll_id"]),)).rowcount:
+                    continue
+                counts = _poll_load_counts(c, str(r["poll_id"]), len(_poll_options(r)))
+                by_channel.setdefault(int(r["channel_id"]), []).append((r, counts))
+            c.commit()
+
+    for pid in due_ids:
+        _poll_countdowns.pop(pid, None)
+
+    sem = asyncio.Semaphore(POLL_CLOSE_CONCURRENCY)
+    with span("edit_messages"):
+        await asyncio.gather(*(_close_channel_polls(ch, items, sem) for ch, items in by_channel.items()))
+
+
+# -------------------------
+# POLL COUNTDOWN REFRESH (edit only when the shown unit changes, budgeted)
+# -------------------------
+class PollCountdown:
+    def __init__(self, row: sqlite3.Row, rendered: str | None):
+        self.guild_id = int(row["guild_id"])
+        self.channel_id = int(row["channel_id"])
+        self.message_id = int(row["message_id"])
+        self.ends_at = int(row["ends_at"])
+        self.question = str(row["question"])
+        self.options = _poll_options(row)
+        self.ping = _poll_ping_text_stored(str(row["ping_mode"]), row["role_id"])
+        self.rendered = rendered  # last text written to the message
+
+    def render(self) -> str:
+        body = _poll_render_active(self.question, self.options, self.ends_at)
+        return f"{(self.ping + chr(10)) if self.ping else ''}{body}"
+
+
+_poll_countdowns: dict[str, PollCountdown] = {}
+_poll_countdown_queue = DeadlineQueue()
+
+
+def schedule_poll_countdown(poll_id: str, row: sqlite3.Row, rendered: str) -> None:
+    cd = _poll_countdowns[poll_id] = PollCountdown(row, rendered)
+    nxt = _poll_countdown_next_change(cd.ends_at, now())
+    if nxt is not None:
+        _poll_countdown_queue.push(nxt, poll_id)
+
+
+@traced_loop("poll_countdown")
+async def _refresh_poll_countdown(poll_id: str) -> None:
+    cd = _poll_countdowns.get(poll_id)
+    if cd is None:
+        return
+
+    if cd.render() != cd.rendered:
+        # coalesce: by the time a token is free the text is re-rendered for "now"
+        with span("rest_wait"):
+            await rest.acquire("countdown", f"messages:{cd.channel_id}")
+        channel = _poll_message_channel(cd.guild_id, cd.channel_id)
+        if channel is not None:
+            async with _channel_edit_lock(cd.channel_id):
+                # the close path pops the poll before taking this lock; never overwrite results
+                if _poll_countdowns.get(poll_id) is cd:
+                    text = cd.render()
+                    if text != cd.rendered:
+                        try:
+                            with span("edit"):
+                                await channel.get_partial_message(cd.message_id).edit(content=text)  # type: ignore
+                            cd.rendered = text
+                        except discord.NotFound:
+                            _poll_countdowns.pop(poll_id, None)
+                            return
+                        except Exception:
+                            traceback.print_exc()
+
+    nxt = _poll_countdown_next_change(cd.ends_at, now())
+    if nxt is not None and poll_id in _poll_countdowns:
+        _poll_countdown_queue.push(nxt, poll_id)
+
+
+@tasks.loop()
+async def poll_countdown_loop():
+    for poll_id in await _poll_countdown_queue.wait_due():
+        await _refresh_poll_countdown(poll_id)
+
+
+# -------------------------
+# COMMAND SYNC (hash-gated; a global sync is a rate-limited bulk PUT)
+# -------------------------
+def command_tree_hash(guild: discord.abc.Snowflake | None = None) -> str:
+    payload = sorted(
+        (cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands(guild=guild)),
+        key=lambda d: (d.get("type", 1), d["name"]),
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_command_tree() -> bool:
+    """Sync globally (or to COMMAND_SYNC_GUILD_ID) if the payload differs from the last successful sync."""
+    guild = discord.Object(COMMAND_SYNC_GUILD_ID) if COMMAND_SYNC_GUILD_ID else None
+    key = f"command_tree_hash:{COMMAND_SYNC_GUILD_ID}" if guild else "command_tree_hash"
+    if guild:
+        bot.tree.copy_global_to(guild=guild)
+
+    digest = command_tree_hash(guild)
+    with db() as c:
+        if meta_get(c, key) == digest:
+            return False
+
+    try:
+        synced = await bot.tree.sync(guild=guild)
+    except discord.HTTPException:
+        # keep booting on the commands Discord already has; the old hash stays, so the next start retries
+        print("Command sync failed; will retry on next start")
+        traceback.print_exc()
+        return False
+    with db() as c:
+        meta_set(c, key, digest)
+        c.commit()
+    print(f"Synced {len(synced)} commands {'to guild ' + str(COMMAND_SYNC_GUILD_ID) if guild else 'globally'}")
+    return True
+
+
+# -------------------------
+# EVENTS
+# -------------------------
+async def _wait_until_ready():
+    await bot.wait_until_ready()
+
+
+async def setup_hook():
+    # once per process, after login and before the gateway connects; reconnects only fire on_ready
+    if owns_guild(0):  # commands are global: the process with shard 0 syncs them
+        await sync_command_tree()
+    load_vc_sessions()
+    load_poll_schedule()  # catch-up: polls that ended while offline are due immediately
+    for loop in (decay_loop, xp_ledger_loop, vc_xp_loop, poll_close_loop, poll_countdown_loop, archive_flush_loop):
+        loop.before_loop(_wait_until_ready)
+        loop.start()
+
+    await start_metrics_server()
+    loop_monitor.start()
+
+
+bot.setup_hook = setup_hook
+
+
+@bot.event
+async def on_ready():
+    for guild in bot.guilds:
+        index_guild_members(guild)
+    # also runs on reconnect: voice states may have changed while we were away
+    for guild in bot.guilds:
+        await vc_reconcile_guild(guild)
+    print("Ready:", bot.user)
+
+    for guild in bot.guilds:
+        try:
+            await archive_catch_up(guild)
+        except Exception:
+            traceback.print_exc()
+
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    index_guild_members(guild)
+
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    if role.name in MANUAL_PRIME_ROLES:
+        index_prime_roles(role.guild)
+
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    _role_members.get(role.guild.id, {}).pop(role.id, None)
+    if role.id in _prime_role_ids.get(role.guild.id, set()):
+        index_prime_roles(role.guild)
+
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    if (before.name in MANUAL_PRIME_ROLES) != (after.name in MANUAL_PRIME_ROLES):
+        index_prime_roles(after.guild)
+
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.roles != after.roles:
+        _update_prime_member(after)
+        _update_member_roles(before, after)
+
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    _add_member(member)
+    _update_prime_member(member)
+
+
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    _remove_member(payload.guild_id, payload.user.id)
+
+
+@bot.event
+async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+    if member.bot:
+        return
+    await vc_reconcile(member.guild, {before.channel, after.channel}, {member.id}, now())
+
+
+@bot.event
+@timed(ON_MESSAGE_SECONDS)
+async def on_message(msg: discord.Message):
+    if not msg.guild:
+        return
+
+    _archive.add(msg)
+    if _archive.due():
+        async with DB_LOCK:
+            with db() as c:
+                _archive.flush(c)
+                c.commit()
+
+    if msg.author.bot:
+        return
+    await bot.process_commands(msg)
+
+    if len((msg.content or "").strip()) < MIN_MESSAGE_CHARS:
+        return
 
     ts = int(msg.created_at.timestamp())
 
@@ -1788,10 +3574,7 @@ async def on_message(msg: discord.Message):
             gained = award_xp(c, msg.guild.id, msg.author.id, CHAT_XP_PER_TICK, ts)
 
             if gained:
-                c.execute(
-                    "UPDATE users SET chat_cooldown=? WHERE guild_id=? AND user_id=?",
-                    (ts + CHAT_COOLDOWN_SECONDS, msg.guild.id, msg.author.id),
-                )
+                xp_store(c, msg.guild.id).update(c, msg.author.id, chat_cooldown=ts + CHAT_COOLDOWN_SECONDS)
 
             c.commit()
 
@@ -1800,87 +3583,375 @@ async def on_message(msg: discord.Message):
 
 
 # -------------------------
-# VC XP (1 XP per 5 minutes)
+# VC XP (1 XP per 5 minutes, tracked as sessions from voice state events)
 # -------------------------
-@tasks.loop(seconds=VC_CHECK_SECONDS)
-async def vc_xp_loop():
+_vc_sessions: dict[tuple[int, int], int] = {}  # (guild_id, user_id) -> uncredited since
+_vc_resume: dict[tuple[int, int], int] = {}  # persisted sessions from the last process, until on_ready checks them
+
+
+def _vc_counting_ids(channel) -> set[int]:
+    """Members of a voice channel who are earning right now."""
+    if channel is None or getattr(channel, "type", None) != discord.ChannelType.voice:
+        return set()
+    humans = [m for m in channel.members if not m.bot]
+    if len(humans) < VC_MIN_HUMANS:
+        return set()
+    return {m.id for m in humans if not (m.voice and (m.voice.deaf or m.voice.self_deaf))}
+
+
+def credit_vc_seconds(c: sqlite3.Connection, gid: int, uid: int, seconds: int, ts: int) -> int:
+    """Bank voice time; each full VC_SECONDS_PER_XP becomes 1 XP. Returns XP awarded."""
+    if seconds <= 0:
+        return 0
+    u = get_user(c, gid, uid)
+    _activity.add_vc(gid, uid, ts - int(seconds), ts)
+    banked = int(u["vc_seconds"] or 0) + int(seconds)
+    gained, banked = divmod(banked, VC_SECONDS_PER_XP)
+
+    # no per-minute cap here: 1 XP / 5 min of voice + 1 XP / min of chat never exceeds it
+    if gained:
+        effective = row_xp(u, ts)
+        new_xp = clamp_xp(effective + gained)
+        xp_store(c, gid).update(c, uid, xp=new_xp, last_active=ts, decay_through=ts, vc_seconds=banked)
+        _xp_ledger.record(c, gid, uid, u, effective, new_xp, "vc", ts)
+    else:
+        xp_store(c, gid).update(c, uid, vc_seconds=banked)
+    return gained
+
+
+def _vc_open(c: sqlite3.Connection, gid: int, uid: int, ts: int) -> None:
+    _vc_sessions[(gid, uid)] = ts
+    c.execute(
+        "INSERT INTO vc_sessions (guild_id, user_id, started_at) VALUES (?,?,?) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET started_at=excluded.started_at",
+        (gid, uid, ts),
+    )
+
+
+def _vc_close(c: sqlite3.Connection, gid: int, uid: int, ts: int) -> int:
+    started = _vc_sessions.pop((gid, uid), None)
+    c.execute(SQL_VC_CLOSE, (gid, uid))
+    if started is None:
+        return 0
+    return credit_vc_seconds(c, gid, uid, ts - started, ts)
+
+
+async def vc_reconcile(guild: discord.Guild, channels, extra_ids: set[int], ts: int) -> None:
+    """Open/close sessions so they match who is earning in `channels` (plus `extra_ids`, who may have left)."""
+    channels = [ch for ch in channels if ch is not None]
+    counting: set[int] = set()
+    candidates = set(extra_ids)
+    for ch in channels:
+        counting |= _vc_counting_ids(ch)
+        candidates.update(m.id for m in ch.members)
+
+    gained = 0
+    async with DB_LOCK:
+        to_open = [uid for uid in counting if (guild.id, uid) not in _vc_sessions]
+        to_close = [uid for uid in candidates if uid not in counting and (guild.id, uid) in _vc_sessions]
+        if not to_open and not to_close:
+            return
+
+        with db() as c:
+            for uid in to_close:
+                gained += _vc_close(c, guild.id, uid, ts)
+            for uid in to_open:
+                _vc_open(c, guild.id, uid, ts)
+            c.commit()
+
+    if gained:
+        await request_role_sync(guild)
+
+
+async def vc_reconcile_guild(guild: discord.Guild) -> None:
     ts = now()
-    for guild in bot.guilds:
-        any_gain = False
+    pending = {uid: _vc_resume.pop((gid, uid)) for gid, uid in list(_vc_resume) if gid == guild.id}
+    if pending:
+        counting = set().union(*(_vc_counting_ids(ch) for ch in guild.voice_channels))
+        fresh_after = ts - VC_CHECKPOINT_SECONDS - VC_RESUME_SECONDS
+        stale = []
+        for uid, started in pending.items():
+            if (guild.id, uid) in _vc_sessions:
+                continue  # a voice event already reopened it
+            if uid in counting and started >= fresh_after:
+                # in voice before and after a quick restart: credit from the last checkpoint, gap included
+                _vc_sessions[(guild.id, uid)] = started
+            else:
+                stale.append((guild.id, uid))  # left, or down too long to know
+        if stale:
+            async with DB_LOCK:
+                with db() as c:
+                    c.executemany(SQL_VC_CLOSE, stale)
+                    c.commit()
 
-        async with DB_LOCK:
-            with db() as c:
-                for vc in guild.voice_channels:
-                    humans = [m for m in vc.members if not m.bot]
-                    if len(humans) < 2:
-                        continue
+    open_ids = {uid for gid, uid in _vc_sessions if gid == guild.id}
+    await vc_reconcile(guild, guild.voice_channels, open_ids, ts)
 
-                    for m in humans:
-                        if m.voice and (m.voice.deaf or m.voice.self_deaf):
-                            continue
 
-                        u = get_user(c, guild.id, m.id)
-                        minutes = int(u["vc_minutes"]) + 1
+def load_vc_sessions() -> int:
+    """Pick up this process's shards' persisted sessions; vc_reconcile_guild resumes or drops them."""
+    _vc_sessions.clear()
+    _vc_resume.clear()
+    with db() as c:
+        for gid, uid, started in c.execute("SELECT guild_id, user_id, started_at FROM vc_sessions"):
+            if owns_guild(gid):
+                _vc_resume[(gid, uid)] = started
+    return len(_vc_resume)
 
-                        if minutes >= VC_MINUTES_PER_XP:
-                            if award_xp(c, guild.id, m.id, 1, ts):
-                                any_gain = True
-                            minutes = 0
 
-                        c.execute(
-                            "UPDATE users SET vc_minutes=? WHERE guild_id=? AND user_id=?",
-                            (minutes, guild.id, m.id),
-                        )
+@tasks.loop(seconds=VC_CHECKPOINT_SECONDS)
+@traced_loop("vc_xp")
+@timed(LOOP_TICK_SECONDS, loop="vc_xp")
+async def vc_xp_loop():
+    if not _vc_sessions:
+        return
 
-                c.commit()
+    ts = now()
+    gained_guilds: set[int] = set()
+    banked: list[tuple[int, int, int]] = []
+    async with DB_LOCK:
+        with db() as c, span("db_write"):
+            for (gid, uid), started in list(_vc_sessions.items()):
+                if ts <= started:
+                    continue
+                if credit_vc_seconds(c, gid, uid, ts - started, ts):
+                    gained_guilds.add(gid)
+                _vc_sessions[(gid, uid)] = ts
+                banked.append((ts, gid, uid))
+            c.executemany(SQL_VC_CHECKPOINT, banked)
+            c.commit()
 
-        if any_gain:
-            await request_role_sync(guild)
+    with span("role_sync_request"):
+        for gid in gained_guilds:
+            guild = bot.get_guild(gid)
+            if guild:
+                await request_role_sync(guild)
 
 
 # -------------------------
-# DECAY
+# DECAY ROLE REFRESH
 # -------------------------
 @tasks.loop(hours=24)
+@traced_loop("decay")
+@timed(LOOP_TICK_SECONDS, loop="decay")
 async def decay_loop():
+    # decay itself is computed on read; this only nudges role sync where ranks may have drifted
     cutoff = now() - DECAY_GRACE_HOURS * 3600
-    for guild in bot.guilds:
-        changed = False
+    for guild in bot.guilds:  # this process's shards only
+        async with DB_LOCK:
+            with db() as c, span("idle_scan"):
+                idle = xp_store(c, guild.id).any_idle(cutoff)
+
+        if idle:
+            with span("role_sync_request"):
+                await request_role_sync(guild)
+
+
+# -------------------------
+# ACTIVITY ARCHIVE (local message index; /audit recomputes from it)
+# -------------------------
+class ArchiveBuffer:
+    def __init__(self):
+        self.rows: list[tuple] = []
+        self.flushed_at = time.monotonic()
+
+    def add(self, msg: discord.Message) -> None:
+        self.rows.append(_archive_row(msg))
+
+    def due(self) -> bool:
+        return len(self.rows) >= ARCHIVE_FLUSH_ROWS or (
+            bool(self.rows) and time.monotonic() - self.flushed_at >= ARCHIVE_FLUSH_SECONDS
+        )
+
+    def flush(self, c: sqlite3.Connection) -> int:
+        rows, self.rows = self.rows, []
+        self.flushed_at = time.monotonic()
+        if rows:
+            _archive_insert(c, rows)
+        return len(rows)
+
+
+_archive = ArchiveBuffer()
+_archive_locks: dict[int, asyncio.Lock] = {}
+
+
+def _archive_row(msg: discord.Message) -> tuple:
+    return (
+        msg.id,
+        msg.guild.id if msg.guild else 0,
+        msg.channel.id,
+        msg.author.id,
+        int(msg.created_at.timestamp()),
+        len((msg.content or "").strip()),
+        1 if msg.author.bot else 0,
+    )
+
+
+def _archive_coverage(c: sqlite3.Connection, guild: discord.Guild) -> dict[int, str | None]:
+    """Channel id -> earliest archived ts. The guild-wide key predates per-channel coverage and still counts."""
+    legacy = meta_get(c, f"archive_from:{guild.id}")
+    return {ch.id: meta_get(c, f"archive_from:{guild.id}:{ch.id}", legacy) for ch in guild.text_channels}
+
+
+def _archive_insert(c: sqlite3.Connection, rows: list[tuple]) -> None:
+    c.executemany(
+        "INSERT OR IGNORE INTO activity_archive "
+        "(message_id, guild_id, channel_id, author_id, created_at, content_len, is_bot) VALUES (?,?,?,?,?,?,?)",
+        rows,
+    )
+
+
+async def _archive_history(guild: discord.Guild, ranges: dict[int, tuple[object, datetime | None]]) -> tuple[int, list[int]]:
+    """Download channel history (channel id -> (after, before)) into the archive.
+
+    Returns (fetched, complete_channel_ids); a channel left out hit a permission gap or an error.
+    """
+    fetched = 0
+    complete: list[int] = []
+    me = guild.me
+    for ch in guild.text_channels:
+        if ch.id not in ranges or not me:
+            continue
+        perms = ch.permissions_for(me)
+        if not perms.view_channel or not perms.read_message_history:
+            continue
+        after, before = ranges[ch.id]
 
+        batch: list[tuple] = []
+        ok = True
+        try:
+            await rest.acquire("history")
+            async for msg in ch.history(after=after, before=before, oldest_first=True, limit=None):
+                batch.append(_archive_row(msg))
+                fetched += 1
+                if fetched % 100 == 0:  # history() pulls the next page of 100 after this one
+                    await rest.acquire("history")
+                if len(batch) >= AUDIT_BATCH_MSGS:
+                    async with DB_LOCK:
+                        with db() as c:
+                            _archive_insert(c, batch)
+                            c.commit()
+                    batch = []
+        except Exception:
+            ok = False
+
+        if batch:
+            async with DB_LOCK:
+                with db() as c:
+                    _archive_insert(c, batch)
+                    c.commit()
+        if ok:
+            complete.append(ch.id)
+
+    return fetched, complete
+
+
+async def archive_backfill(guild: discord.Guild, since_ts: int) -> tuple[int, int]:
+    """Make the archive complete back to since_ts. Returns (fetched, skipped_channels).
+
+    Coverage is kept per channel (meta archive_from:<guild>:<channel>), so a channel that failed
+    or couldn't be read is fetched again next time instead of silently staying short.
+    """
+    lock = _archive_locks.setdefault(guild.id, asyncio.Lock())
+    async with lock:
+        with db() as c:
+            covered = _archive_coverage(c, guild)
+        after = datetime.fromtimestamp(since_ts, timezone.utc)
+        ranges = {
+            cid: (after, datetime.fromtimestamp(int(cov), timezone.utc) if cov is not None else None)
+            for cid, cov in covered.items() if cov is None or since_ts < int(cov)
+        }
+        if not ranges:
+            return 0, 0
+
+        fetched, complete = await _archive_history(guild, ranges)
+
+        with db() as c:
+            for cid in complete:
+                meta_set(c, f"archive_from:{guild.id}:{cid}", since_ts)
+            c.commit()
+        return fetched, len(ranges) - len(complete)
+
+
+async def archive_catch_up(guild: discord.Guild) -> int:
+    """Fetch messages sent while we were offline (only for guilds that have an archive)."""
+    lock = _archive_locks.setdefault(guild.id, asyncio.Lock())
+    async with lock:
         async with DB_LOCK:
             with db() as c:
-                rows = c.execute(
-                    "SELECT user_id, xp, last_active FROM users WHERE guild_id=?",
-                    (guild.id,),
-                ).fetchall()
+                _archive.flush(c)
+                c.commit()
+                ranges: dict[int, tuple[object, datetime | None]] = {}
+                for cid, cov in _archive_coverage(c, guild).items():
+                    if cov is None:
+                        continue  # never archived: the next /audit backfills it
+                    r = c.execute(SQL_ARCHIVE_CHANNEL_HEAD, (cid,)).fetchone()
+                    after = discord.Object(id=int(r["m"])) if r and r["m"] else datetime.fromtimestamp(int(cov), timezone.utc)
+                    ranges[cid] = (after, None)
+                if not ranges:
+                    return 0
+
+        fetched, _ = await _archive_history(guild, ranges)
+        return fetched
+
+
+@tasks.loop(seconds=ARCHIVE_FLUSH_SECONDS)
+@traced_loop("archive_flush")
+async def archive_flush_loop():
+    # on_message only checks due() when the next message arrives; this covers quiet stretches
+    if _archive.due():
+        async with DB_LOCK:
+            with db() as c, span("db_write"):
+                _archive.flush(c)
+                c.commit()
 
-                for r in rows:
-                    xp = int(r["xp"])
-                    if xp <= 0 or int(r["last_active"]) >= cutoff:
-                        continue
 
-                    loss = max(int(xp * DECAY_PERCENT_PER_DAY), DECAY_MIN_XP_PER_DAY)
-                    new_xp = clamp_xp(xp - loss)
-                    if xp >= DECAY_FLOOR_XP:
-                        new_xp = max(DECAY_FLOOR_XP, new_xp)
+# -------------------------
+# XP LEDGER (batched flush + compaction)
+# -------------------------
+def flush_xp_history(c: sqlite3.Connection) -> None:
+    # xp_events are written with each balance change; only the daily rollups are buffered
+    _activity.flush(c)
 
-                    if new_xp != xp:
-                        c.execute(
-                            "UPDATE users SET xp=? WHERE guild_id=? AND user_id=?",
-                            (new_xp, guild.id, int(r["user_id"])),
-                        )
-                        changed = True
 
+@tasks.loop(seconds=XP_LEDGER_FLUSH_SECONDS)
+@traced_loop("xp_ledger")
+async def xp_ledger_loop():
+    if _activity.pending:
+        async with DB_LOCK:
+            with db() as c, span("activity_flush"):
+                flush_xp_history(c)
                 c.commit()
 
-        if changed:
-            await request_role_sync(guild)
+    # housekeeping spans every guild: one process does it, renewing the lease each tick.
+    # The ttl covers several ticks so a slow tick doesn't hand the lease to another process.
+    if not acquire_lease("housekeeping", max(LEASE_SECONDS, 3 * XP_LEDGER_FLUSH_SECONDS)):
+        return
+
+    ts = now()
+    async with DB_LOCK:
+        with db() as c:
+            c.execute(SQL_DM_PRUNE, (ts - DM_DEDUPE_HOURS * 3600,))
+            c.commit()
+
+    # the last run is kept in meta, so a new lease holder waits out the same interval
+    with db() as c:
+        last = int(meta_get(c, "xp_ledger_compacted_at", 0))
+    if ts - last < XP_LEDGER_COMPACT_HOURS * 3600:
+        return
+
+    async with DB_LOCK:
+        with db() as c, span("compact"):
+            compact_xp_ledger(c, ts - XP_LEDGER_RETENTION_DAYS * 86400)
+            meta_set(c, "xp_ledger_compacted_at", ts)
+            c.commit()
 
 
 # -------------------------
 # COMMANDS
 # -------------------------
 @bot.tree.command(name="standing")
+@traced("standing")
 async def standing(interaction: discord.Interaction):
     if not interaction.guild:
         return await interaction.response.send_message("Guild only.", ephemeral=True)
@@ -1889,40 +3960,40 @@ async def standing(interaction: discord.Interaction):
     me = interaction.user
     await interaction.response.defer(ephemeral=True)
 
-    members = await fetch_members(guild)
+    with span("fetch_members"):
+        members = await fetch_members(guild)
     ids = list(members.keys())
 
-    async with DB_LOCK:
-        with db() as c:
-            ensure_users_exist(c, guild.id, ids)
-            c.commit()
-            rows = c.execute("""
-                SELECT user_id, xp FROM users
-                WHERE guild_id=?
-                ORDER BY xp DESC, user_id ASC
-            """, (guild.id,)).fetchall()
+    with span("db_read"):
+        async with DB_LOCK:
+            with db() as c:
+                ensure_users_exist(c, guild.id, ids)
+                c.commit()
+                standings = guild_xp_standings(c, guild.id, now())
 
-    rank_map = compute_rank_map(guild.id, ids)
+    with span("compute_rank_map"):
+        rank_map = compute_rank_map(guild.id, ids)
 
     place = total = myxp = 0
-    for r in rows:
-        uid = int(r["user_id"])
+    for uid, xp in standings:
         if uid not in members:
             continue
         total += 1
         if uid == me.id:
             place = total
-            myxp = int(r["xp"])
+            myxp = xp
 
-    await interaction.followup.send(
-        f"📊 Standing\nPlace: #{place}/{total}\nXP: {myxp}/{MAX_XP}\n"
-        f"Tier: {display_rank(me, rank_map.get(me.id, ROLE_INITIATE))}",
-        ephemeral=True,
-    )
+    with span("followup_send"):
+        await interaction.followup.send(
+            f"📊 Standing\nPlace: #{place}/{total}\nXP: {myxp}/{MAX_XP}\n"
+            f"Tier: {display_rank(me, rank_map.get(me.id, ROLE_INITIATE))}",
+            ephemeral=True,
+        )
 
 
 @bot.tree.command(name="leaderboard")
 @app_commands.describe(announce="Post publicly")
+@traced("leaderboard")
 async def leaderboard(interaction: discord.Interaction, announce: bool = False):
     if not interaction.guild:
         return await interaction.response.send_message("Guild only.", ephemeral=True)
@@ -1930,42 +4001,42 @@ async def leaderboard(interaction: discord.Interaction, announce: bool = False):
     guild = interaction.guild
     await interaction.response.defer(ephemeral=not announce)
 
-    members = await fetch_members(guild)
+    with span("fetch_members"):
+        members = await fetch_members(guild)
     ids = list(members.keys())
 
-    async with DB_LOCK:
-        with db() as c:
-            ensure_users_exist(c, guild.id, ids)
-            c.commit()
-            rows = c.execute("""
-                SELECT user_id, xp FROM users
-                WHERE guild_id=?
-                ORDER BY xp DESC, user_id ASC
-            """, (guild.id,)).fetchall()
+    with span("db_read"):
+        async with DB_LOCK:
+            with db() as c:
+                ensure_users_exist(c, guild.id, ids)
+                c.commit()
+                standings = guild_xp_standings(c, guild.id, now())
 
-    rank_map = compute_rank_map(guild.id, ids)
+    with span("compute_rank_map"):
+        rank_map = compute_rank_map(guild.id, ids)
 
-    lines, place = [], 0
-    for r in rows:
-        uid = int(r["user_id"])
-        if uid not in members:
-            continue
-        place += 1
-        m = members[uid]
-        xp = int(r["xp"])
-        lines.append(
-            f"{place:>4}. {m.display_name} — {xp} XP — {display_rank(m, rank_map.get(uid, ROLE_INITIATE))}"
-        )
+    with span("render"):
+        lines, place = [], 0
+        for uid, xp in standings:
+            if uid not in members:
+                continue
+            place += 1
+            m = members[uid]
+            lines.append(
+                f"{place:>4}. {m.display_name} — {xp} XP — {display_rank(m, rank_map.get(uid, ROLE_INITIATE))}"
+            )
 
-    preview = "\n".join(lines[:30]) if lines else "No users."
-    file = discord.File(fp=io.BytesIO("\n".join(lines).encode()), filename="leaderboard.txt")
+        preview = "\n".join(lines[:30]) if lines else "No users."
+        file = discord.File(fp=io.BytesIO("\n".join(lines).encode()), filename="leaderboard.txt")
 
-    await interaction.followup.send("✅ Leaderboard\n" + preview, ephemeral=not announce)
-    await interaction.followup.send(file=file, ephemeral=not announce)
+    with span("followup_send"):
+        await interaction.followup.send("✅ Leaderboard\n" + preview, ephemeral=not announce)
+        await interaction.followup.send(file=file, ephemeral=not announce)
 
 
 @bot.tree.command(name="audit")
 @app_commands.describe(days="Days back", announce="Post publicly")
+@traced("audit")
 async def audit(interaction: discord.Interaction, days: int = 30, announce: bool = False):
     if not interaction.guild:
         return await interaction.response.send_message("Guild only.", ephemeral=True)
@@ -1973,66 +4044,63 @@ async def audit(interaction: discord.Interaction, days: int = 30, announce: bool
         return await interaction.response.send_message("Prime only.", ephemeral=True)
 
     guild = interaction.guild
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    cutoff = int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp())
     await interaction.response.defer(ephemeral=not announce)
 
-    scanned = awarded = skipped = throttle = 0
+    # only history older than what the archive already covers is downloaded (once)
+    with span("archive_backfill"):
+        fetched, skipped = await archive_backfill(guild, cutoff)
+
+    scanned = awarded = 0
+    # replayed credits land in the ledger now: their xp_after builds on today's balance, so stamping
+    # them at the message's time would put balances that never existed into xp_at() and /xphistory
+    run_ts = now()
 
     async with DB_LOCK:
         with db() as c:
-            reset_audit_state(c, guild.id)
-            c.commit()
+            with span("db_read"):
+                _archive.flush(c)
+                reset_audit_state(c, guild.id)
+                c.commit()
 
-            for ch in guild.text_channels:
-                me = guild.me
-                if not me:
-                    continue
-                perms = ch.permissions_for(me)
-                if not perms.view_channel or not perms.read_message_history:
-                    skipped += 1
-                    continue
+                rows = c.execute(SQL_ARCHIVE_SINCE, (guild.id, cutoff)).fetchall()
 
-                try:
-                    async for msg in ch.history(after=cutoff, oldest_first=True, limit=None):
-                        scanned += 1
-                        if msg.author.bot:
-                            continue
-                        if len((msg.content or "").strip()) < MIN_MESSAGE_CHARS:
-                            continue
-
-                        ts = int(msg.created_at.timestamp())
-                        u = get_user(c, guild.id, msg.author.id)
-                        if ts < int(u["chat_cooldown"]):
-                            continue
-
-                        gained = award_xp(c, guild.id, msg.author.id, CHAT_XP_PER_TICK, ts)
-                        if gained:
-                            awarded += gained
-                            c.execute(
-                                "UPDATE users SET chat_cooldown=? WHERE guild_id=? AND user_id=?",
-                                (ts + CHAT_COOLDOWN_SECONDS, guild.id, msg.author.id),
-                            )
-
-                        throttle += 1
-                        if throttle % AUDIT_SLEEP_EVERY_MSGS == 0:
-                            c.commit()
-                            await asyncio.sleep(AUDIT_SLEEP_SECONDS)
+            with span("recompute"):
+                for r in rows:
+                    scanned += 1
+                    if r["is_bot"]:
+                        continue
+                    if int(r["content_len"]) < MIN_MESSAGE_CHARS:
+                        continue
 
-                except Exception:
-                    skipped += 1
+                    ts = int(r["created_at"])
+                    uid = int(r["author_id"])
+                    u = get_user(c, guild.id, uid)
+                    if ts < int(u["chat_cooldown"]):
+                        continue
 
-            c.commit()
+                    gained = award_xp(c, guild.id, uid, CHAT_XP_PER_TICK, ts, reason="audit", recorded_at=run_ts)
+                    if gained:
+                        awarded += gained
+                        xp_store(c, guild.id).update(c, uid, chat_cooldown=ts + CHAT_COOLDOWN_SECONDS)
 
-    ok, failed = await sync_all_roles(guild)
-    await interaction.followup.send(
-        f"Audit complete\nDays: {days}\nScanned: {scanned}\nAwarded XP: {awarded}\n"
-        f"Role Sync: {ok}/{failed}\nSkipped Channels: {skipped}",
-        ephemeral=not announce,
-    )
+            with span("db_write"):
+                flush_xp_history(c)
+                c.commit()
+
+    with span("role_sync"):
+        ok, failed = await sync_all_roles(guild)
+    with span("followup_send"):
+        await interaction.followup.send(
+            f"Audit complete\nDays: {days}\nScanned: {scanned}\nAwarded XP: {awarded}\n"
+            f"Role Sync: {ok}/{failed}\nSkipped Channels: {skipped}\nDownloaded: {fetched}",
+            ephemeral=not announce,
+        )
 
 
 @bot.tree.command(name="resetranks")
 @app_commands.describe(member="Optional single member")
+@traced("resetranks")
 async def resetranks(interaction: discord.Interaction, member: discord.Member | None = None):
     if not interaction.guild:
         return await interaction.response.send_message("Guild only.", ephemeral=True)
@@ -2042,37 +4110,42 @@ async def resetranks(interaction: discord.Interaction, member: discord.Member |
     guild = interaction.guild
     await interaction.response.defer(ephemeral=True)
 
-    members = await fetch_members(guild)
+    with span("fetch_members"):
+        members = await fetch_members(guild)
     targets = [member.id] if member else list(members.keys())
 
     changed = 0
-    async with DB_LOCK:
-        with db() as c:
-            ensure_users_exist(c, guild.id, targets)
-            for uid in targets:
-                u = get_user(c, guild.id, uid)
-                old = int(u["xp"])
-                new = old if old < INITIATE_EXIT_XP else INITIATE_EXIT_XP
-                if new != old:
-                    changed += 1
-
-                c.execute("""
-                    UPDATE users
-                    SET xp=?, last_active=0, chat_cooldown=0, last_minute=0,
-                        earned_this_minute=0, vc_minutes=0
-                    WHERE guild_id=? AND user_id=?
-                """, (new, guild.id, uid))
-            c.commit()
+    ts = now()
+    with span("db_write"):
+        async with DB_LOCK:
+            with db() as c:
+                ensure_users_exist(c, guild.id, targets)
+                for uid in targets:
+                    u = get_user(c, guild.id, uid)
+                    old = row_xp(u, ts)
+                    new = old if old < INITIATE_EXIT_XP else INITIATE_EXIT_XP
+                    if new != old:
+                        changed += 1
+                    _xp_ledger.record(c, guild.id, uid, u, old, new, "reset", ts)
+
+                    xp_store(c, guild.id).update(
+                        c, uid, xp=new, last_active=0, decay_through=ts, chat_cooldown=0, last_minute=0,
+                        earned_this_minute=0, vc_seconds=0,
+                    )
+                c.commit()
 
-    ok, failed = await sync_all_roles(guild)
-    await interaction.followup.send(
-        f"Reset complete\nChanged XP: {changed}\nRole Sync: {ok}/{failed}",
-        ephemeral=True,
-    )
+    with span("role_sync"):
+        ok, failed = await sync_all_roles(guild)
+    with span("followup_send"):
+        await interaction.followup.send(
+            f"Reset complete\nChanged XP: {changed}\nRole Sync: {ok}/{failed}",
+            ephemeral=True,
+        )
 
 
 @bot.tree.command(name="setxp")
 @app_commands.describe(member="User", xp="New XP", announce="Public?")
+@traced("setxp")
 async def setxp(interaction: discord.Interaction, member: discord.Member, xp: int, announce: bool = False):
     if not interaction.guild:
         return await interaction.response.send_message("Guild only.", ephemeral=True)
@@ -2080,30 +4153,195 @@ async def setxp(interaction: discord.Interaction, member: discord.Member, xp: in
         return await interaction.response.send_message("Prime only.", ephemeral=True)
 
     xp = clamp_xp(xp)
+    ts = now()
     await interaction.response.defer(ephemeral=not announce)
 
     async with DB_LOCK:
         with db() as c:
-            get_user(c, interaction.guild.id, member.id)
-            c.execute("""
-                UPDATE users
-                SET xp=?, last_active=?, chat_cooldown=0, last_minute=0,
-                    earned_this_minute=0, vc_minutes=0
-                WHERE guild_id=? AND user_id=?
-            """, (xp, now(), interaction.guild.id, member.id))
+            u = get_user(c, interaction.guild.id, member.id)
+            _xp_ledger.record(c, interaction.guild.id, member.id, u, row_xp(u, ts), xp, "set", ts)
+            xp_store(c, interaction.guild.id).update(
+                c, member.id, xp=xp, last_active=ts, decay_through=ts, chat_cooldown=0, last_minute=0,
+                earned_this_minute=0, vc_seconds=0,
+            )
             c.commit()
 
-    ok, failed = await sync_all_roles(interaction.guild)
-    await interaction.followup.send(
-        f"Set {member.display_name} → {xp} XP\nSync {ok}/{failed}",
-        ephemeral=not announce,
-    )
+    with span("role_sync"):
+        ok, failed = await sync_all_roles(interaction.guild)
+    with span("followup_send"):
+        await interaction.followup.send(
+            f"Set {member.display_name} → {xp} XP\nSync {ok}/{failed}",
+            ephemeral=not announce,
+        )
+
+
+@bot.tree.command(name="xphistory")
+@app_commands.describe(member="User", days="How many days back")
+async def xphistory(interaction: discord.Interaction, member: discord.Member, days: int = 7):
+    if not interaction.guild:
+        return await interaction.response.send_message("Guild only.", ephemeral=True)
+    if not is_admin(interaction):
+        return await interaction.response.send_message("Prime only.", ephemeral=True)
+
+    ts = now()
+    since = ts - max(0, days) * 86400
+    async with DB_LOCK:
+        with db() as c:
+            flush_xp_history(c)
+            c.commit()
+            then = xp_at(c, interaction.guild.id, member.id, since)
+            u = get_user(c, interaction.guild.id, member.id)
+            current = row_xp(u, ts)
+            events = c.execute(SQL_XP_HISTORY, (interaction.guild.id, member.id, since)).fetchall()
+
+    lines = [f"📜 XP history — {member.display_name}", f"{days}d ago: {then} XP → now: {current} XP", ""]
+    for e in events:
+        lines.append(f"<t:{int(e['ts'])}:R> {int(e['delta']):+d} ({e['reason']}) → {int(e['xp_after'])}")
+    if not events:
+        lines.append("No changes in this window.")
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+
+@bot.tree.command(name="activity")
+@app_commands.describe(days="Window in days (e.g. 7, 30, 90)", member="Optional single member")
+async def activity(interaction: discord.Interaction, days: int = 7, member: discord.Member | None = None):
+    if not interaction.guild:
+        return await interaction.response.send_message("Guild only.", ephemeral=True)
+    if not is_admin(interaction):
+        return await interaction.response.send_message("Prime only.", ephemeral=True)
+
+    guild = interaction.guild
+    days = max(1, min(days, 366))
+    first_day = day_of(now()) - days + 1
+
+    async with DB_LOCK:
+        with db() as c:
+            flush_xp_history(c)
+            c.commit()
+            if member:
+                rows = c.execute(SQL_ACTIVITY_MEMBER, (guild.id, first_day, member.id)).fetchall()
+            else:
+                # summed here rather than GROUP BY user_id, which sorts the whole range in a temp B-tree
+                totals: dict[int, dict] = {}
+                for uid, chat, vc, gained, decayed in c.execute(SQL_ACTIVITY_GUILD, (guild.id, first_day)):
+                    t = totals.setdefault(uid, {"user_id": uid, "chat": 0, "vc": 0, "gained": 0, "decayed": 0})
+                    t["chat"] += chat
+                    t["vc"] += vc
+                    t["gained"] += gained
+                    t["decayed"] += decayed
+                rows = list(totals.values())
+
+    rows = [r for r in rows if r["user_id"] is not None]
+    active = [r for r in rows if int(r["chat"]) > 0 or int(r["vc"]) > 0]
+
+    if member:
+        r = rows[0] if rows else None
+        text = (
+            f"📈 Activity — {member.display_name} — last {days}d\n"
+            f"Chat ticks: {int(r['chat']) if r else 0}\nVC minutes: {int(r['vc']) // 60 if r else 0}\n"
+            f"XP gained: {int(r['gained']) if r else 0}\nXP decayed: {int(r['decayed']) if r else 0}"
+        )
+        return await interaction.response.send_message(text, ephemeral=True)
+
+    lines = [
+        f"📈 Activity — last {days}d",
+        f"Active members: {len(active)}",
+        f"Chat ticks: {sum(int(r['chat']) for r in rows)} | VC minutes: {sum(int(r['vc']) for r in rows) // 60}",
+        f"XP gained: {sum(int(r['gained']) for r in rows)} | XP decayed: {sum(int(r['decayed']) for r in rows)}",
+        "",
+    ]
+    top = sorted(rows, key=lambda r: (-int(r["gained"]), int(r["user_id"])))[:10]
+    for place, r in enumerate(top, start=1):
+        if int(r["gained"]) <= 0:
+            break
+        m = guild.get_member(int(r["user_id"]))
+        name = m.display_name if m else f"<@{int(r['user_id'])}>"
+        lines.append(f"{place:>2}. {name} — +{int(r['gained'])} XP")
+
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+
+@bot.tree.command(name="botstats", description="Internal cache and runtime stats (Prime only, private).")
+async def botstats(interaction: discord.Interaction):
+    if not interaction.guild:
+        return await interaction.response.send_message("Guild only.", ephemeral=True)
+    if not is_admin(interaction):
+        return await interaction.response.send_message("Prime only.", ephemeral=True)
+
+    lines = [
+        "📊 **Bot stats (private)**",
+        f"Render cache: {_render_cache.stats()}",
+        f"REST: {rest.stats()}",
+        f"Loop lag: {loop_monitor.stats()}",
+        f"Process: {PROCESS_ID}, " + (f"shards {SHARD_IDS or 'all'} of {SHARD_COUNT}" if SHARD_COUNT else "unsharded"),
+        f"Notify images: {_image_bytes_in // 1024} KB in, {_image_bytes_saved // 1024} KB saved"
+        + ("" if Image is not None else " (Pillow not installed, preprocessing off)"),
+        *trace_summary(),
+    ]
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+
+_profile_running = False
+
+
+def _profile_report(prof: cProfile.Profile, snap: tracemalloc.Snapshot, seconds: int) -> str:
+    out = io.StringIO()
+    out.write(f"Profile window: {seconds}s\n\n=== Top functions by cumulative time ===\n")
+    stats = pstats.Stats(prof, stream=out).strip_dirs()
+    stats.sort_stats("cumulative").print_stats(40)
+    out.write("\n=== Top functions by own time ===\n")
+    stats.sort_stats("tottime").print_stats(25)
+    out.write("\n=== Allocation sites (allocated during the window, still live) ===\n")
+    for st in snap.statistics("lineno")[:25]:
+        out.write(f"{st.size / 1024:10.1f} KB {st.count:8d} blocks  {st.traceback}\n")
+    return out.getvalue()
+
+
+@bot.tree.command(name="profile")
+@app_commands.describe(seconds="How long to profile (max 120)")
+async def profile(interaction: discord.Interaction, seconds: int = 30):
+    global _profile_running
+    if not interaction.guild:
+        return await interaction.response.send_message("Guild only.", ephemeral=True)
+    if not is_admin(interaction):
+        return await interaction.response.send_message("Prime only.", ephemeral=True)
+    if _profile_running:
+        return await interaction.response.send_message("A profile is already running.", ephemeral=True)
+
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    _profile_running = True
+    await interaction.response.defer(ephemeral=True)
+
+    prof = cProfile.Profile()
+    started_tracemalloc = not tracemalloc.is_tracing()
+    try:
+        if started_tracemalloc:
+            tracemalloc.start(10)
+        prof.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            prof.disable()
+            snap = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            if started_tracemalloc:
+                tracemalloc.stop()
+        report = _profile_report(prof, snap, seconds)
+    finally:
+        _profile_running = False
+
+    file = discord.File(fp=io.BytesIO(report.encode()), filename=f"profile-{now()}.txt")
+    await interaction.followup.send(f"🧪 Profile of the last {seconds}s", file=file, ephemeral=True)
 
 
 # -------------------------
 # RUN
 # -------------------------
-token = os.getenv("DISCORD_TOKEN")
-if not token:
-    raise RuntimeError("DISCORD_TOKEN missing")
-bot.run(token)
+if __name__ == "__main__":  # importable without connecting (bench.py)
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        raise RuntimeError("DISCORD_TOKEN missing")
+    init_db()
+    bot.run(token)
@@ -0,0 +1,581 @@
+"""Soak test: drive main.py's handlers through an in-process fake gateway and REST API.
+
+Nothing connects to Discord. Fake guilds/members/channels are fed to on_message,
+on_voice_state_update, poll vote buttons and slash command callbacks at fixed
+rates. The fake REST layer adds latency and enforces Discord-like rate-limit
+buckets. Each 429 goes through main.py's HTTP trace hook, so the governor
+counts it as it would a real response, and is logged the way discord.http
+logs its retries.
+
+    python soak.py                                   # 60s at the default rates
+    python soak.py --msg-rate 200 --duration 120
+    python soak.py --ramp 5                          # double all rates each window until interactions miss 3s
+    python soak.py --processes 4 --duration 20       # one shard per process on a shared DB; exit 1 on double work
+    python soak.py --processes 2 --overlap           # every process takes every guild: the XP check must fail
+"""
+import os, sys, json, time, random, asyncio, logging, argparse, tempfile, shutil, atexit, traceback, subprocess
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+_tmp = tempfile.mkdtemp(prefix="phoenixp-soak-")
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+os.environ.setdefault("XP_DB_PATH", os.path.join(_tmp, "xp.db"))
+os.environ.setdefault("TRACE_PATH", os.path.join(_tmp, "traces.jsonl"))
+
+import discord  # noqa: E402
+import main  # noqa: E402  (DB path must be set before import)
+
+INTERACTION_DEADLINE = 3.0
+SOAK_COMPACT_SECONDS = 2  # --processes: ledger compaction interval while soaking
+_http_log = logging.getLogger("discord.http")
+_RESPONSE_429 = SimpleNamespace(response=SimpleNamespace(status=429))  # what aiohttp hands on_request_end
+
+
+# -------------------------
+# FAKE REST (latency + Discord-like buckets, 429 -> trace hook + retry like discord.http)
+# -------------------------
+class FakeRest:
+    # bucket prefix -> (requests, per seconds)
+    LIMITS = {"global": (50, 1.0), "roles": (10, 10.0), "dm": (5, 5.0), "messages": (5, 5.0), "members": (10, 10.0)}
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000.0
+        self.windows: dict[str, list[float]] = {}
+        self.calls: dict[str, int] = {}
+        self.rate_limited: dict[str, int] = {}
+
+    def _retry_after(self, key: str) -> float:
+        limit, per = self.LIMITS[key.split(":", 1)[0]]
+        t = time.monotonic()
+        hits = [h for h in self.windows.get(key, []) if t - h < per]
+        self.windows[key] = hits
+        if len(hits) >= limit:
+            return per - (t - hits[0])
+        hits.append(t)
+        return 0.0
+
+    async def call(self, key: str) -> None:
+        while True:
+            wait = self._retry_after("global") or self._retry_after(key)
+            if not wait:
+                break
+            self.rate_limited[key.split(":", 1)[0]] = self.rate_limited.get(key.split(":", 1)[0], 0) + 1
+            await main._count_429(None, None, _RESPONSE_429)
+            _http_log.warning("We are being rate limited. %s responded with 429. Retrying in %.2f seconds.", key, wait)
+            await asyncio.sleep(wait)
+        self.calls[key.split(":", 1)[0]] = self.calls.get(key.split(":", 1)[0], 0) + 1
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+
+# -------------------------
+# FAKE GATEWAY OBJECTS (only the attributes main.py reads)
+# -------------------------
+class FakeRole:
+    def __init__(self, rid: int, name: str):
+        self.id = rid
+        self.name = name
+        self.members: list["FakeMember"] = []
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeMember:
+    def __init__(self, uid: int, guild: "FakeGuild", rest: FakeRest, bot: bool = False):
+        self.id = uid
+        self.guild = guild
+        self.bot = bot
+        self.display_name = f"member{uid}"
+        self.roles: list[FakeRole] = [guild.default_role]
+        self.voice = None
+        self._rest = rest
+
+    async def add_roles(self, *roles, reason=None):
+        await self._rest.call(f"roles:{self.guild.id}")
+        self.roles.extend(r for r in roles if r not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await self._rest.call(f"roles:{self.guild.id}")
+        self.roles = [r for r in self.roles if r not in roles]
+
+    async def send(self, *args, **kwargs):
+        await self._rest.call("dm")
+
+
+class FakeTextChannel:
+    def __init__(self, cid: int, rest: FakeRest):
+        self.id = cid
+        self._rest = rest
+        self.edits: Counter = Counter()  # message id -> edits
+
+    def get_partial_message(self, mid: int):
+        async def edit(**kwargs):
+            await self._rest.call(f"messages:{self.id}")
+            self.edits[mid] += 1
+        return SimpleNamespace(id=mid, edit=edit)
+
+
+class FakeVoiceChannel:
+    type = discord.ChannelType.voice
+
+    def __init__(self, cid: int):
+        self.id = cid
+        self.members: list[FakeMember] = []
+
+
+class FakeGuild:
+    def __init__(self, gid: int, size: int, voice_channels: int, rest: FakeRest):
+        self.id = gid
+        self._rest = rest
+        self.default_role = FakeRole(gid, "@everyone")
+        self.roles = [self.default_role] + [FakeRole(gid * 100 + i, n) for i, n in enumerate(main.ROLE_NAMES, start=1)]
+        self._members = {uid: FakeMember(uid, self, rest) for uid in range(gid * 1_000_000, gid * 1_000_000 + size)}
+        self.voice_channels = [FakeVoiceChannel(gid * 10_000 + i) for i in range(voice_channels)]
+        self.text_channels: list = []
+        self._text: dict[int, FakeTextChannel] = {}
+        self.me = None
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, uid: int):
+        return self._members.get(uid)
+
+    def get_channel_or_thread(self, cid: int):
+        if cid not in self._text:
+            self._text[cid] = FakeTextChannel(cid, self._rest)
+        return self._text[cid]
+
+    async def fetch_members(self, limit=None):
+        members = self.members
+        for i in range(0, len(members), 1000):  # one REST page per 1000 members
+            await self._rest.call(f"members:{self.id}")
+            for m in members[i:i + 1000]:
+                yield m
+
+
+class FakeResponse:
+    def __init__(self, ix: "FakeInteraction"):
+        self.ix = ix
+
+    def _mark(self):
+        if self.ix.first_response is None:
+            self.ix.first_response = time.monotonic()
+
+    async def defer(self, **kwargs):
+        self._mark()
+
+    async def send_message(self, *args, **kwargs):
+        self._mark()
+
+
+class FakeFollowup:
+    def __init__(self, rest: FakeRest, channel_id: int):
+        self.rest = rest
+        self.channel_id = channel_id
+
+    async def send(self, *args, **kwargs):
+        await self.rest.call(f"messages:{self.channel_id}")
+
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild, user: FakeMember, rest: FakeRest):
+        self.guild = guild
+        self.user = user
+        self.created = time.monotonic()
+        self.first_response: float | None = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(rest, guild.id)
+
+
+# -------------------------
+# LOAD DRIVER
+# -------------------------
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.done = 0
+        self.errors = 0
+        self.latencies: list[float] = []
+        self.ack: list[float] = []  # interactions: time to first response
+        self.missed = 0
+        self.first_error: str | None = None
+
+    def summary(self, seconds: float) -> dict:
+        def pct(xs, q):
+            if not xs:
+                return None
+            xs = sorted(xs)
+            return round(xs[min(len(xs) - 1, int(q * (len(xs) - 1)))] * 1000, 1)
+
+        out = {
+            "sent": self.sent, "completed": self.done, "errors": self.errors,
+            "throughput_per_s": round(self.done / seconds, 1),
+            "p50_ms": pct(self.latencies, 0.50), "p95_ms": pct(self.latencies, 0.95),
+            "p99_ms": pct(self.latencies, 0.99), "max_ms": pct(self.latencies, 1.0),
+        }
+        if self.ack:
+            out["ack_p99_ms"] = pct(self.ack, 0.99)
+            out["missed_3s_deadline"] = self.missed
+        if self.first_error:
+            out["first_error"] = self.first_error
+        return out
+
+
+async def _run(stats: Stats, coro, interaction: FakeInteraction | None = None) -> None:
+    t = time.monotonic()
+    try:
+        await coro
+        stats.done += 1
+    except Exception:
+        stats.errors += 1
+        if stats.first_error is None:
+            stats.first_error = traceback.format_exc(limit=3)
+    stats.latencies.append(time.monotonic() - t)
+    if interaction is not None:
+        ack = (interaction.first_response or time.monotonic()) - interaction.created
+        stats.ack.append(ack)
+        if ack > INTERACTION_DEADLINE:
+            stats.missed += 1
+
+
+async def _ticker(rate: float, seconds: float, fire) -> None:
+    """Open-loop generator: fire() every 1/rate seconds no matter how far behind handlers are."""
+    if rate <= 0:
+        return
+    interval = 1.0 / rate
+    start = time.monotonic()
+    n = 0
+    while (due := start + n * interval) < start + seconds:
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        fire(n)
+        n += 1
+
+
+class Soak:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rest = FakeRest(args.rest_latency_ms)
+        # snowflake-like ids so (id >> 22) % shard_count spreads guilds over shards; only ours are "connected"
+        self.guilds = [
+            FakeGuild(gid, args.members, args.voice_channels, self.rest)
+            for gid in ((g + 1) << 22 for g in range(args.guilds)) if main.owns_guild(gid)
+        ]
+        self.tasks: set[asyncio.Task] = set()
+        self.msg_id = 1
+        self.polls: list[tuple[FakeGuild, str, list[str]]] = []
+
+    def setup(self) -> None:
+        main.init_db()
+        main.bot._connection.user = SimpleNamespace(id=1, bot=True)
+        main.ROLE_SYNC_DEBOUNCE_SECONDS = self.args.role_sync_debounce
+        for g in self.guilds:
+            main.bot._connection._guilds[g.id] = g
+            main.index_guild_members(g)
+            with main.db() as c:
+                main.ensure_users_exist(c, g.id, list(g._members))
+                c.commit()
+
+    def seed_polls(self, ends_at: int) -> list[int]:
+        """Three open polls per guild; returns their message ids."""
+        ts = main.now()
+        with main.db() as c:
+            for g in self.guilds:
+                for _ in range(3):
+                    c.execute("""
+                        INSERT INTO polls (poll_id, guild_id, channel_id, message_id, created_by, created_at, ends_at,
+                                          question, options_json, ping_mode, role_id, dm_enabled, closed)
+                        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,0)
+                    """, (main._poll_make_id(), g.id, g.id, self.rng.randrange(1, 1 << 40), 1, ts, ends_at,
+                          "Where next?", json.dumps(["Mars", "Super Earth", "Malevelon Creek", "Veil"]), "none", None, 0))
+            c.commit()
+            mids = [mid for (mid,) in c.execute("SELECT message_id FROM polls")]
+        self.load_polls()
+        return mids
+
+    def load_polls(self) -> None:
+        by_id = {g.id: g for g in self.guilds}
+        with main.db() as c:
+            rows = c.execute("SELECT poll_id, guild_id, options_json FROM polls").fetchall()
+        self.polls = [(by_id[r["guild_id"]], r["poll_id"], json.loads(r["options_json"])) for r in rows if r["guild_id"] in by_id]
+
+    def poll_edits(self) -> Counter:
+        edits = Counter()
+        for g in self.guilds:
+            for ch in g._text.values():
+                edits.update(ch.edits)
+        return edits
+
+    def _spawn(self, coro) -> None:
+        t = asyncio.create_task(coro)
+        self.tasks.add(t)
+        t.add_done_callback(self.tasks.discard)
+
+    def _member(self) -> tuple[FakeGuild, FakeMember]:
+        g = self.rng.choice(self.guilds)
+        return g, g._members[g.id * 1_000_000 + self.rng.randrange(len(g._members))]
+
+    def message(self, stats: Stats):
+        def fire(_):
+            g, m = self._member()
+            self.msg_id += 1
+            msg = SimpleNamespace(
+                id=self.msg_id, guild=g, channel=SimpleNamespace(id=g.id), author=m,
+                content="pushing the front on Mars tonight", created_at=datetime.now(timezone.utc),
+                _state=main.bot._connection,  # bot.process_commands builds a Context from it
+            )
+            stats.sent += 1
+            self._spawn(_run(stats, main.on_message(msg)))
+        return fire
+
+    def voice(self, stats: Stats):
+        def fire(_):
+            g, m = self._member()
+            before = SimpleNamespace(channel=m.voice.channel if m.voice else None)
+            if before.channel is not None and self.rng.random() < 0.5:
+                before.channel.members.remove(m)
+                m.voice = None
+            else:
+                if before.channel is not None:
+                    before.channel.members.remove(m)
+                ch = self.rng.choice(g.voice_channels)
+                ch.members.append(m)
+                m.voice = SimpleNamespace(channel=ch, deaf=False, self_deaf=False)
+            after = SimpleNamespace(channel=m.voice.channel if m.voice else None)
+            stats.sent += 1
+            self._spawn(_run(stats, main.on_voice_state_update(m, before, after)))
+        return fire
+
+    def vote(self, stats: Stats):
+        def fire(_):
+            g, poll_id, options = self.rng.choice(self.polls)
+            m = g._members[g.id * 1_000_000 + self.rng.randrange(len(g._members))]
+            idx = self.rng.randrange(len(options))
+            button = main.PollVoteButton(poll_id=poll_id, option_index=idx, label=options[idx], row=0, disabled=False)
+            ix = FakeInteraction(g, m, self.rest)
+            stats.sent += 1
+            self._spawn(_run(stats, button.callback(ix), ix))
+        return fire
+
+    def command(self, stats: Stats):
+        def fire(n):
+            g, m = self._member()
+            ix = FakeInteraction(g, m, self.rest)
+            cb = main.standing.callback(ix) if n % 4 else main.leaderboard.callback(ix, False)
+            stats.sent += 1
+            self._spawn(_run(stats, cb, ix))
+        return fire
+
+    async def window(self, scale: float, seconds: float) -> dict:
+        a = self.args
+        stats = {name: Stats() for name in ("messages", "voice", "votes", "commands")}
+        calls0, limited0 = dict(self.rest.calls), dict(self.rest.rate_limited)
+        t = time.monotonic()
+        await asyncio.gather(
+            _ticker(a.msg_rate * scale, seconds, self.message(stats["messages"])),
+            _ticker(a.voice_rate * scale, seconds, self.voice(stats["voice"])),
+            _ticker(a.vote_rate * scale, seconds, self.vote(stats["votes"])),
+            _ticker(a.command_rate * scale, seconds, self.command(stats["commands"])),
+        )
+        sent_for = time.monotonic() - t
+        # drain: what is still queued after the window is backlog, not throughput
+        drained = await asyncio.wait(list(self.tasks), timeout=a.drain) if self.tasks else None
+        backlog = len(drained[1]) if drained else 0
+        return {
+            "scale": scale,
+            "seconds": round(sent_for, 1),
+            "handlers": {k: v.summary(sent_for) for k, v in stats.items()},
+            "backlog_after_drain": backlog,
+            "rest_calls": {k: v - calls0.get(k, 0) for k, v in self.rest.calls.items()},
+            "rest_429s": {k: v - limited0.get(k, 0) for k, v in self.rest.rate_limited.items()},
+            "governor": main.rest.stats(),
+            "loop_lag": main.loop_monitor.stats(),
+        }
+
+
+def _print_window(r: dict) -> None:
+    print(f"\n=== x{r['scale']:g} for {r['seconds']}s (backlog after drain: {r['backlog_after_drain']}) ===")
+    for name, s in r["handlers"].items():
+        if not s["sent"]:
+            continue
+        line = (f"{name:9} sent {s['sent']:>6}  done {s['completed']:>6}  err {s['errors']:>3}  "
+                f"{s['throughput_per_s']:>8}/s  p50 {s['p50_ms']}ms  p99 {s['p99_ms']}ms  max {s['max_ms']}ms")
+        if "ack_p99_ms" in s:
+            line += f"  ack p99 {s['ack_p99_ms']}ms  missed 3s: {s['missed_3s_deadline']}"
+        print(line)
+        if s.get("first_error"):
+            print("   first error:", s["first_error"].strip().splitlines()[-1])
+    print("REST calls:", r["rest_calls"], " 429s:", r["rest_429s"] or 0)
+    print("Governor:", r["governor"])
+    print("Loop lag:", r["loop_lag"])
+
+
+async def amain(args) -> None:
+    soak = Soak(args)
+    soak.setup()
+    soak.seed_polls(main.now() + 86400)
+    main.loop_monitor.start()
+
+    results = []
+    scale = 1.0
+    for step in range(max(1, args.ramp)):
+        r = await soak.window(scale, args.duration)
+        _print_window(r)
+        results.append(r)
+        ix = [r["handlers"][k] for k in ("votes", "commands") if r["handlers"][k]["sent"]]
+        if args.ramp > 1 and (r["backlog_after_drain"] or any(s["missed_3s_deadline"] for s in ix)):
+            print(f"\nSaturated at x{scale:g}; last sustained step: x{scale / 2:g}" if step else "\nSaturated at base rates")
+            break
+        scale *= 2
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "windows": results}, f, indent=2)
+        print(f"\nSaved {args.out}")
+
+
+# -------------------------
+# MULTI-PROCESS (one shard per process on a shared DB)
+# -------------------------
+async def shard_worker(args) -> None:
+    """One process of a --processes run: drive our shards' guilds with the close and ledger loops live."""
+    soak = Soak(args)
+    soak.setup()
+    soak.load_polls()
+
+    # compaction due every 2s, checked every 0.5s: the lease keeps it to one process and the
+    # stored timestamp keeps that process to one run per interval
+    main.XP_LEDGER_COMPACT_HOURS = SOAK_COMPACT_SECONDS / 3600
+    compactions = 0
+    compact = main.compact_xp_ledger
+
+    def counting_compact(c, horizon):
+        nonlocal compactions
+        compactions += 1
+        return compact(c, horizon)
+
+    main.compact_xp_ledger = counting_compact
+    main.xp_ledger_loop.change_interval(seconds=0.5)
+    main.load_poll_schedule()
+    main.poll_close_loop.start()
+    main.xp_ledger_loop.start()
+    main.loop_monitor.start()
+
+    r = await soak.window(1.0, args.duration)
+    main.poll_close_loop.cancel()
+    main.xp_ledger_loop.cancel()
+    async with main.DB_LOCK:
+        with main.db() as c:
+            main.flush_xp_history(c)
+            c.commit()
+
+    with open(args.worker_report, "w") as f:
+        json.dump({
+            "process": main.PROCESS_ID, "shards": os.getenv("SHARD_IDS", "all"), "guilds": [g.id for g in soak.guilds],
+            "compactions": compactions, "poll_edits": {str(k): v for k, v in soak.poll_edits().items()}, "window": r,
+        }, f)
+
+
+def run_processes(args) -> int:
+    main.init_db()
+    seeder = Soak(args)
+    poll_messages = seeder.seed_polls(main.now() + max(1, int(args.duration / 2)))  # due mid-run
+
+    procs = []
+    for i in range(args.processes):
+        env = dict(os.environ, XP_DB_PATH=main.DB_PATH, TRACE_PATH=os.path.join(_tmp, f"traces{i}.jsonl"))
+        if not args.overlap:
+            env.update(SHARD_COUNT=str(args.processes), SHARD_IDS=str(i))
+        report = os.path.join(_tmp, f"worker{i}.json")
+        cmd = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--worker-report", report]
+        procs.append((report, subprocess.Popen(cmd, env=env)))
+    if any(p.wait() for _, p in procs):
+        print("a worker process failed")
+        return 1
+    reports = [json.load(open(path)) for path, _ in procs]
+
+    for r in reports:
+        m = r["window"]["handlers"]["messages"]
+        print(f"shard {r['shards']:>4}  guilds {len(r['guilds']):>3}  messages {m['completed']:>6} (err {m['errors']})  "
+              f"p99 {m['p99_ms']}ms  ledger compactions {r['compactions']}")
+
+    failures = []
+    # XP: with one writer per guild, users.xp is exactly the sum of that user's ledger deltas. Two processes
+    # awarding in the same guild each start from their own cached row, so one overwrites the other.
+    with main.db() as c:
+        ledger = {(g, u): d for g, u, d in c.execute("SELECT guild_id, user_id, SUM(delta) FROM xp_events GROUP BY 1, 2")}
+        users = c.execute("SELECT guild_id, user_id, xp FROM users").fetchall()
+        still_open = c.execute("SELECT COUNT(*) FROM polls WHERE closed=0").fetchone()[0]
+    mismatched = [(g, u) for g, u, xp in users if xp != ledger.get((g, u), 0)]
+    print(f"XP: {sum(ledger.values())} awarded to {sum(1 for d in ledger.values() if d)} members, "
+          f"{len(mismatched)} balances disagree with the ledger")
+    if mismatched:
+        failures.append(f"double-awarded / lost XP for {len(mismatched)} members (e.g. {mismatched[0]})")
+
+    shared = [gid for gid, n in Counter(g for r in reports for g in r["guilds"]).items() if n > 1]
+    if shared:
+        failures.append(f"{len(shared)} guilds were driven by more than one process")
+
+    edits = Counter()
+    for r in reports:
+        edits.update({int(k): v for k, v in r["poll_edits"].items()})
+    wrong = [mid for mid in poll_messages if edits[mid] != 1]
+    print(f"Polls: {len(poll_messages)} seeded, {still_open} still open, {len(wrong)} not closed exactly once")
+    if still_open or wrong:
+        failures.append(f"polls closed != once: {still_open} open, {len(wrong)} with edits != 1")
+
+    compactors = [r["shards"] for r in reports if r["compactions"]]
+    print(f"Ledger compaction ran on shard(s): {', '.join(compactors) or 'none'}")
+    if len(compactors) != 1:
+        failures.append(f"ledger compaction ran on {len(compactors)} processes")
+    # now() is whole seconds, so allow one extra run per window edge
+    allowed = int(args.duration // SOAK_COMPACT_SECONDS) + 2
+    runs = sum(r["compactions"] for r in reports)
+    if runs > allowed:
+        failures.append(f"ledger compaction ran {runs} times in {args.duration}s (interval {SOAK_COMPACT_SECONDS}s)")
+
+    for f in failures:
+        print("FAIL:", f)
+    if not failures:
+        print("OK: every guild, poll and compaction handled by exactly one process")
+    return 1 if failures else 0
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--duration", type=float, default=60, help="seconds per window")
+    ap.add_argument("--ramp", type=int, default=1, help="windows to run, doubling rates each time")
+    ap.add_argument("--guilds", type=int, default=2)
+    ap.add_argument("--members", type=int, default=5000, help="members per guild")
+    ap.add_argument("--voice-channels", type=int, default=10)
+    ap.add_argument("--msg-rate", type=float, default=50, help="messages per second")
+    ap.add_argument("--voice-rate", type=float, default=5, help="voice state updates per second")
+    ap.add_argument("--vote-rate", type=float, default=10, help="poll button clicks per second")
+    ap.add_argument("--command-rate", type=float, default=1, help="slash commands per second (/standing, /leaderboard)")
+    ap.add_argument("--rest-latency-ms", type=float, default=80)
+    ap.add_argument("--role-sync-debounce", type=float, default=5, help="overrides ROLE_SYNC_DEBOUNCE_SECONDS")
+    ap.add_argument("--drain", type=float, default=30, help="seconds to let in-flight handlers finish per window")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--processes", type=int, default=0, help="run this many shard processes against one DB")
+    ap.add_argument("--overlap", action="store_true", help="with --processes: no sharding, every process takes every guild")
+    ap.add_argument("--worker-report", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.worker_report:
+        asyncio.run(shard_worker(args))
+    elif args.processes:
+        sys.exit(run_processes(args))
+    else:
+        asyncio.run(amain(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,45 @@
+"""Hash-gated command sync: skipped when unchanged, and an HTTP error doesn't stop startup.
+
+    python -m pytest -q test_command_sync.py
+"""
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import discord  # noqa: E402
+import main  # noqa: E402
+
+
+def stored_hash():
+    key = f"command_tree_hash:{main.COMMAND_SYNC_GUILD_ID}" if main.COMMAND_SYNC_GUILD_ID else "command_tree_hash"
+    with main.db() as c:
+        return main.meta_get(c, key)
+
+
+def test_http_error_keeps_booting_and_retries_next_start(monkeypatch):
+    main.init_db()
+    with main.db() as c:
+        c.execute("DELETE FROM meta WHERE key LIKE 'command_tree_hash%'")
+        c.commit()
+    calls = []
+
+    async def failing_sync(guild=None):
+        calls.append("fail")
+        raise discord.HTTPException(SimpleNamespace(status=503, reason="Service Unavailable"), "upstream")
+
+    async def ok_sync(guild=None):
+        calls.append("ok")
+        return []
+
+    monkeypatch.setattr(main.bot.tree, "sync", failing_sync)
+    assert asyncio.run(main.sync_command_tree()) is False
+    assert stored_hash() is None
+
+    monkeypatch.setattr(main.bot.tree, "sync", ok_sync)
+    assert asyncio.run(main.sync_command_tree()) is True
+    assert stored_hash() == main.command_tree_hash()
+    assert asyncio.run(main.sync_command_tree()) is False  # unchanged tree: no PUT
+    assert calls == ["fail", "ok"]
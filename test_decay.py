@@ -0,0 +1,78 @@
+"""Lazy decay (closed form, applied on read) must match the old eager daily decay_loop.
+
+    python -m pytest -q test_decay.py
+"""
+import os
+import random
+import tempfile
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import pytest  # noqa: E402
+import main  # noqa: E402
+
+DAY = 86400
+GRACE = main.DECAY_GRACE_HOURS * 3600
+
+
+def eager_step(xp: int) -> int:
+    # body of the pre-lazy decay_loop, per user per run
+    if xp <= 0:
+        return xp
+    loss = max(int(xp * main.DECAY_PERCENT_PER_DAY), main.DECAY_MIN_XP_PER_DAY)
+    new_xp = main.clamp_xp(xp - loss)
+    if xp >= main.DECAY_FLOOR_XP:
+        new_xp = max(main.DECAY_FLOOR_XP, new_xp)
+    return new_xp
+
+
+def eager(xp: int, last_active: int, ts: int) -> int:
+    # the loop ran every 24h and decayed anyone with last_active < now - grace
+    t = last_active + GRACE + 1
+    while t <= ts:
+        xp = eager_step(xp)
+        t += DAY
+    return xp
+
+
+def _cases(rng: random.Random, n: int):
+    for _ in range(n):
+        xp = rng.choice([0, 1, 2, main.DECAY_FLOOR_XP, main.DECAY_FLOOR_XP + 1, main.MAX_XP, rng.randrange(0, main.MAX_XP + 1)])
+        last_active = rng.randrange(1_600_000_000, 1_700_000_000)
+        steps = rng.randrange(0, 400)
+        # exact step boundaries and one second either side, plus arbitrary offsets
+        ts = last_active + GRACE + steps * DAY + rng.choice([-1, 0, 1, rng.randrange(-DAY, DAY)])
+        yield xp, last_active, ts
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lazy_matches_eager(seed):
+    rng = random.Random(seed)
+    for xp, last_active, ts in _cases(rng, 2000):
+        assert main.effective_xp(xp, last_active, last_active, ts) == eager(xp, last_active, ts), (xp, last_active, ts)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_materialized_midway_matches_eager(seed):
+    # decay written back at some point (decay_through) and then read later must not double-count steps
+    rng = random.Random(1000 + seed)
+    for xp, last_active, ts in _cases(rng, 2000):
+        mid = rng.randrange(last_active, max(last_active, ts) + 1)
+        partial = main.effective_xp(xp, last_active, last_active, mid)
+        assert main.effective_xp(partial, last_active, mid, ts) == eager(xp, last_active, ts), (xp, last_active, mid, ts)
+
+
+def test_step_boundaries():
+    la = 1_650_000_000
+    assert main.decay_steps_due(la, la + GRACE) == 0
+    assert main.decay_steps_due(la, la + GRACE + 1) == 1
+    assert main.decay_steps_due(la, la + GRACE + DAY) == 1
+    assert main.decay_steps_due(la, la + GRACE + DAY + 1) == 2
+
+
+def test_floor_clamp():
+    la = 1_650_000_000
+    far = la + GRACE + 10_000 * DAY
+    assert main.effective_xp(main.MAX_XP, la, la, far) == main.DECAY_FLOOR_XP
+    for xp in range(0, main.DECAY_FLOOR_XP):
+        assert main.effective_xp(xp, la, la, far) == eager(xp, la, far)
@@ -0,0 +1,53 @@
+"""A repeated DM campaign skips members it already reached within DM_DEDUPE_HOURS.
+
+    python -m pytest -q test_dm_dedupe.py
+"""
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import main  # noqa: E402
+
+GID = 11 << 22
+
+
+def members(*ids):
+    return [SimpleNamespace(id=i) for i in ids]
+
+
+def test_resend_skips_reached_members():
+    main.init_db()
+
+    async def run():
+        await main.dm_record(GID, "notify:a", [1, 2])
+        pending = await main.dm_pending(GID, "notify:a", members(1, 2, 3))
+        other = await main.dm_pending(GID, "notify:b", members(1, 2, 3))
+        elsewhere = await main.dm_pending(GID + (1 << 22), "notify:a", members(1, 2, 3))
+        return pending, other, elsewhere
+
+    pending, other, elsewhere = asyncio.run(run())
+    assert [m.id for m in pending] == [3]
+    assert [m.id for m in other] == [1, 2, 3]  # a different message is not a duplicate
+    assert [m.id for m in elsewhere] == [1, 2, 3]  # nor the same message in another guild
+
+
+def test_deliveries_older_than_the_window_do_not_count():
+    main.init_db()
+    old = main.now() - main.DM_DEDUPE_HOURS * 3600 - 1
+    with main.db() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO dm_deliveries (guild_id, campaign_key, user_id, sent_at) VALUES (?,?,?,?)",
+            (GID, "notify:old", 5, old),
+        )
+        c.commit()
+    pending = asyncio.run(main.dm_pending(GID, "notify:old", members(5)))
+    assert [m.id for m in pending] == [5]
+
+
+def test_summary_names_duplicates():
+    assert "Duplicate" in main._dm_summary(0, 0, 4)
+    assert "2 skipped as duplicates" in main._dm_summary(3, 0, 2)
+    assert main._dm_summary(3, 1, 0) == "DMs: 3 sent, 1 failed"
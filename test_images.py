@@ -0,0 +1,41 @@
+"""Notify image handling: magic-byte sniffing and EXIF orientation on re-encode.
+
+    python -m pytest -q test_images.py
+"""
+import io
+import os
+import tempfile
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import pytest  # noqa: E402
+import main  # noqa: E402
+
+
+@pytest.mark.parametrize("data, kind", [
+    (b"\x89PNG\r\n\x1a\n" + b"\0" * 8, "png"),
+    (b"\xff\xd8\xff\xe0" + b"\0" * 8, "jpeg"),
+    (b"GIF87a" + b"\0" * 8, "gif"),
+    (b"GIF89a" + b"\0" * 8, "gif"),
+    (b"RIFF\0\0\0\0WEBPVP8 ", "webp"),
+    (b"RIFF\0\0\0\0WAVEfmt ", None),  # RIFF but not WebP
+    (b"<svg xmlns=", None),
+    (b"", None),
+])
+def test_image_kind_sniffs_magic_bytes(data, kind):
+    assert main.image_kind(data) == kind
+
+
+def test_exif_orientation_is_baked_in():
+    Image = pytest.importorskip("PIL.Image")
+    if main.Image is None:
+        pytest.skip("main imported without Pillow")
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90° clockwise to display
+    Image.new("RGB", (400, 200), "red").save(buf, "JPEG", exif=exif, quality=95)
+
+    out = main._preprocess_image(buf.getvalue(), "jpeg", 100)
+    with Image.open(io.BytesIO(out)) as im:
+        assert im.size == (50, 100)  # portrait, as a viewer would show the original
+        assert im.getexif().get(0x0112, 1) == 1
@@ -0,0 +1,71 @@
+"""Prime and role indexes stay in step with member-update and role-delete events.
+
+    python -m pytest -q test_member_index.py
+"""
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import main  # noqa: E402
+
+PRIME = next(iter(main.MANUAL_PRIME_ROLES))
+
+
+def make_guild(gid: int):
+    """Guild with a Prime role, a plain role, a member holding each and a bot holding both."""
+    guild = SimpleNamespace(id=gid, roles=[], members=[])
+    prime = SimpleNamespace(id=gid + 1, name=PRIME, guild=guild, members=[])
+    squad = SimpleNamespace(id=gid + 2, name="Squad", guild=guild, members=[])
+    guild.roles = [prime, squad]
+    alice = SimpleNamespace(id=101, bot=False, guild=guild, roles=[prime])
+    bob = SimpleNamespace(id=102, bot=False, guild=guild, roles=[squad])
+    robot = SimpleNamespace(id=103, bot=True, guild=guild, roles=[prime, squad])
+    guild.members = [alice, bob, robot]
+    prime.members = [alice, robot]
+    squad.members = [bob, robot]
+    main.index_guild_members(guild)
+    return guild, prime, squad, alice, bob
+
+
+def with_roles(m, roles):
+    return SimpleNamespace(id=m.id, bot=m.bot, guild=m.guild, roles=roles)
+
+
+def test_initial_index():
+    guild, prime, squad, alice, bob = make_guild(1 << 22)
+    assert main._prime_members[guild.id] == {alice.id, 103}
+    assert main._role_members[guild.id] == {prime.id: {alice.id}, squad.id: {bob.id}}  # bots left out
+    assert main._human_members[guild.id] == {alice.id, bob.id}
+
+
+def test_member_update_moves_prime_and_roles():
+    guild, prime, squad, alice, bob = make_guild(2 << 22)
+    promoted = with_roles(bob, [squad, prime])
+    asyncio.run(main.on_member_update(bob, promoted))
+    assert main.has_prime(promoted)
+    assert main._role_members[guild.id][prime.id] == {alice.id, bob.id}
+
+    demoted = with_roles(alice, [])
+    asyncio.run(main.on_member_update(alice, demoted))
+    assert not main.has_prime(demoted)
+    assert alice.id not in main._role_members[guild.id][prime.id]
+
+
+def test_role_delete_drops_role_and_prime():
+    guild, prime, squad, alice, bob = make_guild(3 << 22)
+    asyncio.run(main.on_guild_role_delete(squad))
+    assert squad.id not in main._role_members[guild.id]
+
+    guild.roles = [squad]  # the gateway cache no longer has the Prime role
+    asyncio.run(main.on_guild_role_delete(prime))
+    assert main._prime_members[guild.id] == set()
+    assert not main.has_prime(alice)
+
+
+def test_unindexed_guild_falls_back_to_role_names():
+    guild = SimpleNamespace(id=4 << 22)
+    m = SimpleNamespace(id=1, bot=False, guild=guild, roles=[SimpleNamespace(id=9, name=PRIME)])
+    assert main.has_prime(m)
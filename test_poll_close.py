@@ -0,0 +1,43 @@
+"""A poll close tick that fails puts its deadlines back instead of dropping them.
+
+    python -m pytest -q test_poll_close.py
+"""
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import main  # noqa: E402
+
+
+def test_failed_close_requeues_deadlines(monkeypatch):
+    async def boom(due_ids):
+        raise RuntimeError("db is locked")
+
+    monkeypatch.setattr(main, "close_due_polls", boom)
+    queue = main.DeadlineQueue()
+    monkeypatch.setattr(main, "_poll_close_queue", queue)
+    ts = main.now()
+    queue.replace([(ts - 5, "a"), (ts - 1, "b"), (ts + 3600, "later")])
+
+    asyncio.run(main.poll_close_loop.coro())
+
+    retry_at = sorted(queue._heap)
+    assert [k for _, k in retry_at] == ["a", "b", "later"]
+    assert all(due >= ts + main.POLL_CLOSE_RETRY_SECONDS for due, k in retry_at if k != "later")
+
+
+def test_successful_close_does_not_requeue(monkeypatch):
+    closed = []
+
+    async def close(due_ids):
+        closed.extend(due_ids)
+
+    monkeypatch.setattr(main, "close_due_polls", close)
+    queue = main.DeadlineQueue()
+    monkeypatch.setattr(main, "_poll_close_queue", queue)
+    queue.replace([(main.now() - 1, "a")])
+
+    asyncio.run(main.poll_close_loop.coro())
+    assert closed == ["a"] and len(queue) == 0
@@ -0,0 +1,30 @@
+"""Every hot statement in main.py uses an index: no unlisted SCAN, no temp B-tree.
+
+    python -m pytest -q test_query_plans.py
+"""
+import random
+
+import bench
+import main
+
+
+def test_hot_statements_use_indexes():
+    main.init_db()
+    bench.seed_for_plans(random.Random(1))
+    with main.db() as c:
+        assert bench.check_plans(c) == []
+
+
+def test_allowlist_names_real_queries():
+    # a renamed query would otherwise leave a stale entry that allows nothing
+    assert set(bench.SCAN_OK) <= {name for name, _, _ in bench.HOT_QUERIES}
+
+
+def test_unlisted_scan_fails():
+    main.init_db()
+    with main.db() as c:
+        bench.HOT_QUERIES.append(("full scan", "SELECT * FROM xp_events", ()))
+        try:
+            assert bench.check_plans(c) == ["full scan"]
+        finally:
+            bench.HOT_QUERIES.pop()
@@ -0,0 +1,43 @@
+"""_RenderCache: bounded LRU with hit/miss stats; a closing poll drops its fragments.
+
+    python -m pytest -q test_render_cache.py
+"""
+import os
+import tempfile
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import main  # noqa: E402
+
+
+def test_lru_evicts_least_recently_used():
+    cache = main._RenderCache(2)
+    cache.get(("a",), lambda: "A")
+    cache.get(("b",), lambda: "B")
+    cache.get(("a",), lambda: "stale")  # touch a: b is now the oldest
+    cache.get(("c",), lambda: "C")
+    assert list(cache._items) == [("a",), ("c",)]
+    assert cache.get(("a",), lambda: "rebuilt") == "A"
+    assert cache.get(("b",), lambda: "rebuilt") == "rebuilt"
+
+
+def test_stats_count_hits_and_misses():
+    cache = main._RenderCache(4)
+    built = []
+    for key in ["x", "x", "y", "x"]:
+        cache.get((key,), lambda key=key: built.append(key) or key)
+    assert built == ["x", "y"]
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert cache.stats() == "2 hits / 2 misses (50.0%), 2/4 entries"
+
+
+def test_closing_a_poll_drops_its_fragments(monkeypatch):
+    cache = main._RenderCache(64)
+    monkeypatch.setattr(main, "_render_cache", cache)
+    question, options = "Where do we drop tonight?", ["Super Earth", "Mars"]
+    main._poll_render_active(question, options, main.now() + 3600)
+    assert ("poll_options", tuple(options)) in cache._items
+
+    text = main._poll_render_closed(question, options, [2, 1], main.now())
+    assert "CLOSED" in text and "Total votes: **3**" in text
+    assert not cache._items  # nothing of a closed poll stays cached
@@ -0,0 +1,103 @@
+"""TokenBucket refill/burst and RestGovernor grant order.
+
+    python -m pytest -q test_rest_governor.py
+"""
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import pytest  # noqa: E402
+import main  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def test_token_bucket_burst_then_rate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(main.time, "monotonic", clock)
+    b = main.TokenBucket(60, burst=3)  # one token a second
+    for _ in range(3):
+        assert b.wait_time() == 0
+        b.tokens -= 1
+    assert b.wait_time() == pytest.approx(1.0)
+    clock.t += 0.5
+    assert b.wait_time() == pytest.approx(0.5)
+    clock.t += 3600
+    b._refill()
+    assert b.tokens == 3  # idle time never banks more than the burst
+
+
+def test_token_bucket_acquire_waits_for_refill():
+    b = main.TokenBucket(600, burst=1)  # a token every 0.1s
+
+    async def run():
+        await b.acquire()
+        t = asyncio.get_running_loop().time()
+        await b.acquire()
+        return asyncio.get_running_loop().time() - t
+
+    assert asyncio.run(run()) == pytest.approx(0.1, abs=0.05)
+
+
+def _grant_order(waiters, limits):
+    """Queue (name, keys, priority) waiters in order; return names in the order they were granted."""
+    async def run():
+        gov = main.RestGovernor(100)
+        for prefix, (per_minute, burst) in limits.items():
+            gov.define(prefix, per_minute, burst)
+        order = []
+
+        async def one(name, keys, priority):
+            await gov.acquire(*keys, priority=priority)
+            order.append(name)
+
+        await asyncio.gather(*(one(*w) for w in waiters))
+        gov._task.cancel()
+        return order, gov
+
+    return asyncio.run(run())
+
+
+def test_interactive_goes_before_queued_bulk():
+    bulk, inter = main.RestGovernor.BULK, main.RestGovernor.INTERACTIVE
+    order, gov = _grant_order(
+        [("b1", ("x",), bulk), ("b2", ("x",), bulk), ("i1", ("x",), inter), ("b3", ("x",), bulk), ("i2", ("x",), inter)],
+        {"x": (600, 1)},
+    )
+    assert order == ["i1", "i2", "b1", "b2", "b3"]  # FIFO within a priority
+    assert gov.granted == [2, 3]
+
+
+def test_blocked_interactive_does_not_hold_up_other_buckets():
+    bulk, inter = main.RestGovernor.BULK, main.RestGovernor.INTERACTIVE
+    order, _ = _grant_order(
+        [("i-first", ("slow",), inter), ("i-second", ("slow",), inter), ("bulk", ("fast",), bulk)],
+        {"slow": (120, 1), "fast": (600, 1)},
+    )
+    # the second interactive waits ~0.5s for "slow"; bulk on "fast" is granted meanwhile
+    assert order == ["i-first", "bulk", "i-second"]
+
+
+def test_unknown_bucket_prefix_fails_at_the_caller():
+    async def run():
+        await main.RestGovernor(10).acquire("nope:1")
+
+    with pytest.raises(KeyError):
+        asyncio.run(run())
+
+
+def test_429_hook_counts_only_rate_limited_responses():
+    from types import SimpleNamespace
+
+    before = main.rest.rate_limited
+    for status in (200, 429, 404, 429):
+        asyncio.run(main._count_429(None, None, SimpleNamespace(response=SimpleNamespace(status=status))))
+    assert main.rest.rate_limited - before == 2
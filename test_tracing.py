@@ -0,0 +1,46 @@
+"""Background loop ticks are traced like commands; idle ticks are not written.
+
+    python -m pytest -q test_tracing.py
+"""
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import main  # noqa: E402
+
+
+def test_loop_tick_writes_a_trace_with_its_spans(monkeypatch):
+    written = []
+    monkeypatch.setattr(main, "_write_trace", lambda trace, total, error: written.append((trace, error)))
+
+    @main.traced_loop("demo")
+    async def tick(busy: bool):
+        if busy:
+            with main.span("db_write"):
+                with main.span("flush"):
+                    pass
+
+    asyncio.run(tick(False))
+    assert written == []  # idle tick
+    asyncio.run(tick(True))
+    [(trace, error)] = written
+    assert trace.command == "loop:demo" and error is None
+    assert [p for p, _, _ in trace.spans] == ["db_write/flush", "db_write"]
+    assert main._current_trace.get() is None
+
+
+def test_failed_tick_is_written_even_without_spans(monkeypatch):
+    written = []
+    monkeypatch.setattr(main, "_write_trace", lambda trace, total, error: written.append(error))
+
+    @main.traced_loop("demo")
+    async def tick():
+        raise RuntimeError("boom")
+
+    try:
+        asyncio.run(tick())
+    except RuntimeError:
+        pass
+    assert written == ["RuntimeError: boom"]
@@ -0,0 +1,58 @@
+"""xp_events compaction keeps each user's real last event.
+
+    python -m pytest -q test_xp_ledger.py
+"""
+import os
+import tempfile
+
+os.environ.setdefault("XP_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="phoenixp-test-"), "xp.db"))
+
+import main  # noqa: E402
+
+DAY = 86400
+
+
+def test_compaction_keeps_last_row_when_decay_shares_its_ts():
+    main.init_db()
+    gid, uid = 901 << 22, 42
+    ts = 1_700_000_000
+    idle_since = ts - main.DECAY_GRACE_HOURS * 3600 - 3 * DAY  # a few decay steps pending
+    with main.db() as c:
+        main.get_user(c, gid, uid)
+        main.xp_store(c, gid).update(c, uid, xp=5000, last_active=idle_since, decay_through=idle_since)
+        c.commit()
+        # the award writes back the pending decay and then the chat credit, both at `ts`
+        assert main.award_xp(c, gid, uid, 1, ts)
+        c.commit()
+        reasons = [r["reason"] for r in c.execute(
+            "SELECT reason FROM xp_events WHERE guild_id=? AND user_id=? AND ts=? ORDER BY rowid", (gid, uid, ts)
+        )]
+        assert reasons == ["decay", "chat"]
+
+        main.compact_xp_ledger(c, ts + 1)
+        c.commit()
+        rows = c.execute("SELECT delta, xp_after, reason FROM xp_events WHERE guild_id=? AND user_id=?", (gid, uid)).fetchall()
+        balance = c.execute("SELECT xp FROM users WHERE guild_id=? AND user_id=?", (gid, uid)).fetchone()["xp"]
+
+    assert len(rows) == 1
+    assert rows[0]["reason"] == "snapshot"
+    assert rows[0]["xp_after"] == balance
+    assert rows[0]["delta"] == balance  # balance is still the sum of the deltas
+    with main.db() as c:
+        assert main.xp_at(c, gid, uid, ts) == balance
+
+
+def test_replayed_credit_is_recorded_at_run_time():
+    main.init_db()
+    gid, uid = 902 << 22, 7
+    run_ts = 1_700_000_000
+    sent_at = run_ts - 5 * DAY
+    with main.db() as c:
+        main.get_user(c, gid, uid)
+        main.xp_store(c, gid).update(c, uid, xp=300, last_active=run_ts, decay_through=run_ts)
+        c.commit()
+        assert main.award_xp(c, gid, uid, 1, sent_at, reason="audit", recorded_at=run_ts)
+        c.commit()
+        # nothing is known before the audit ran; afterwards the ledger shows the real balance
+        assert main.xp_at(c, gid, uid, sent_at) == 0
+        assert main.xp_at(c, gid, uid, run_ts) == main.get_user(c, gid, uid)["xp"]